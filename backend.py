@@ -1,10 +1,11 @@
 import os
 import mimetypes
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-os.environ["OMP_NUM_THREADS"] = "1"
+os.environ.setdefault("OMP_NUM_THREADS", "1")  # Override via the environment to give torch/FAISS more threads
 os.environ["PATH"] += os.pathsep + r"C:\ffmpeg\bin\bin"
 os.environ["FFMPEG_BINARY"] = r"C:\ffmpeg\bin\bin\ffmpeg.exe"
 import re
+import time
 import json
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify, send_from_directory, g, session
@@ -41,7 +42,36 @@ from prompts import (
     EXAMPLE_USAGE,
     generate_source_link
 )
-from backend.utils import initialize_faiss_index, update_faiss_index
+from backend.utils import initialize_faiss_index, update_faiss_index, configure_embedding_threads, EMBEDDING_BATCH_CONFIG
+from backend.snapshot_utils import SnapshotStore
+from backend.agent_cache import AgentRetrieverCache
+from backend.shared_store import SharedVectorStore
+from backend.index_factory import INDEX_CONFIG
+from backend.embedding_cache import CachedEmbeddings, normalize_query
+from backend.model_registry import model_registry, LazyModel, MODEL_REGISTRY_CONFIG
+from backend.startup import StartupTracker, STARTUP_CONFIG
+from backend.chunking import CHUNKING_CONFIG, chunker_config, chunk_text
+from backend.response_cache import ResponseCache, response_cache_key, federated_cache_agent
+from backend.semantic_cache import SemanticAnswerCache, SEMANTIC_CACHE_CONFIG
+from backend.rerank import (
+    mmr_documents, MMR_CONFIG, CrossEncoderReranker, CROSS_ENCODER_CONFIG,
+    AdaptiveTopK, ADAPTIVE_K_CONFIG, cosine_similarities
+)
+from backend.feedback_scores import feedback_scores, feedback_vote
+from backend.context_builder import build_context_documents, token_budget, doc_chunk_ids
+from backend.federated import federated_search, FEDERATED_CONFIG
+from backend.extract_utils import (
+    EXTRACTION_CONFIG,
+    AUDIO_EXTENSIONS,
+    extract_structured,
+    extract_text,
+    extract_pdf,
+    preprocess_image_for_ocr,
+    extract_image,
+    load_pdf_page_range,
+    load_file_documents,
+    extract_files_parallel
+)
 from backend.banner_utils import save_banner_file, load_banner_file, remove_banner_file, get_banner_storage_info
 import logging
 import faiss
@@ -65,20 +95,15 @@ import pandas as pd
 import pdfplumber
 import pytesseract
 import base64
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 from PIL import Image
 import cv2
 import numpy as np
 import json as pyjson
-# PATCH: Add Whisper for server-side audio transcription
-try:
-    import whisper
-    whisper_model = whisper.load_model('base')
-    WHISPER_AVAILABLE = True
-except Exception as e:
-    WHISPER_AVAILABLE = False
-    whisper_model = None
-    print(f"[WARNING] Whisper not available: {e}")
+import importlib.util
+# PATCH: Add Whisper for server-side audio transcription (the model itself loads on first use)
+WHISPER_AVAILABLE = importlib.util.find_spec('whisper') is not None
+if not WHISPER_AVAILABLE:
+    print("[WARNING] Whisper not available: the openai-whisper package is not installed")
 
 # Suppress Faiss GPU warnings
 warnings.filterwarnings("ignore", message=".*GpuIndexIVFFlat.*")
@@ -165,22 +190,70 @@ genai.configure(api_key=GOOGLE_API_KEY)
 
 # Configure ElevenLabs API
 ELEVENLABS_API_KEY = os.getenv("ELEVENLABS_API_KEY")
-# Initialize ElevenLabs client
-elevenlabs_client = ElevenLabs(api_key=ELEVENLABS_API_KEY)
+# Initialize ElevenLabs client (built on first use)
+model_registry.register('elevenlabs', lambda: ElevenLabs(api_key=ELEVENLABS_API_KEY))
+elevenlabs_client = LazyModel(model_registry, 'elevenlabs')
 
 # Configure Sarvam API
 SARVAM_API_KEY = os.getenv("SARVAM_API_KEY")
 
-# Initialize the LLM
-llm = ChatGoogleGenerativeAI(
+# Initialize the LLM (built on first use)
+model_registry.register('gemini', lambda: ChatGoogleGenerativeAI(
     model="gemini-2.5-flash-preview-05-20",  # Updated to correct model name
     temperature=0.7,
     google_api_key=GOOGLE_API_KEY,
     streaming=True
-)
+))
 
 # Initialize the embeddings
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")  # Multilingual support
+EMBEDDING_MODEL_NAME = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Every ingestion path goes through this cache, so identical chunk text is only ever embedded once per model
+def load_sentence_transformer():
+    configure_embedding_threads()
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL_NAME,
+        cache_folder=CHUNKING_CONFIG['cache_dir'],  # Same files the chunker's tokenizer is loaded from
+        encode_kwargs={'batch_size': EMBEDDING_BATCH_CONFIG['encode_batch_size']}
+    )
+
+def load_whisper():
+    import whisper
+    return whisper.load_model('base')
+
+model_registry.register('sentence_transformer', load_sentence_transformer)
+model_registry.register('whisper', load_whisper, idle_timeout=MODEL_REGISTRY_CONFIG['whisper_idle_seconds'])
+model_registry.register('ollama', lambda: OllamaClient())
+
+def load_cross_encoder():
+    from sentence_transformers import CrossEncoder
+    configure_embedding_threads()
+    # No cache kwarg: its name differs across sentence-transformers releases; HF_HOME picks the cache
+    return CrossEncoder(CROSS_ENCODER_CONFIG['model'], max_length=CROSS_ENCODER_CONFIG['max_length'], device='cpu')
+
+model_registry.register('cross_encoder', load_cross_encoder)
+cross_encoder = CrossEncoderReranker(model_registry, 'cross_encoder')
+adaptive_top_k = AdaptiveTopK()
+# Only texts missing from the cache make the registry load the sentence-transformer
+embeddings = CachedEmbeddings(LazyModel(model_registry, 'sentence_transformer'), EMBEDDING_MODEL_NAME)  # Multilingual support
+
+# Chunking settings per loader. They are part of each file's snapshot key, so bumping
+# a version (or changing a size) re-embeds only the files that loader produces.
+# Sizes are in embedder tokens, capped at the model's max sequence length.
+CHUNKER_CONFIGS = {
+    'agent_file': chunker_config('agent_file'),
+}
+
+# On-disk snapshots of chunked, embedded files keyed by content hash, chunker config and model
+snapshot_store = SnapshotStore(embeddings, EMBEDDING_MODEL_NAME)
+
+# Every chunk is embedded and stored once here; the general and per-agent retrievers are views over it
+shared_store = SharedVectorStore(embeddings)
+
+# Finished chat answers keyed by agent, source filter, model, normalized query and index version
+response_cache = ResponseCache()
+
+# Answers to near-duplicate questions, reused while every chunk they cited is unchanged
+semantic_cache = SemanticAnswerCache(lambda chunk_id: chunk_id in shared_store.chunk_to_id)
 
 document_heading = None
 
@@ -199,85 +272,21 @@ document_heading = None
 
 # manual_page_mappings = load_manual_page_mappings()
 
-def load_pdfs_from_directory(directory_path: str) -> list[Document]:
-    """Load all PDFs from a directory and convert them to documents"""
-    global document_heading
-    documents = []
-    
-    # Add logging to debug PDF loading
-    logger.info(f"load_pdfs_from_directory called with directory_path: {directory_path}") # Log the input path
+def pdf_directory_snapshot_entries():
+    """Snapshot entries (file_path, chunker_config, loader) for every PDF in the upload folder"""
     pdf_pattern = os.path.join(app.config['UPLOAD_FOLDER'], "*.pdf") # Use configured UPLOAD_FOLDER
     logger.info(f"Searching for PDFs with pattern: {pdf_pattern}")
-    pdf_files = glob.glob(pdf_pattern)
+    pdf_files = sorted(glob.glob(pdf_pattern))
     logger.info(f"Found PDF files: {pdf_files}") # Log the result of glob.glob
-    
-    for pdf_file in pdf_files:
-        try:
-            reader = PdfReader(pdf_file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            
-            doc = Document(
-                page_content=text,
-                metadata={"source": os.path.basename(pdf_file)}
-            )
-            documents.append(doc)
-            logger.info(f"Successfully loaded PDF: {pdf_file}")
-        except Exception as e:
-            logger.error(f"Error loading PDF {pdf_file}: {str(e)}")
-    
-    if documents:
-        # Set the global document_heading using the first loaded document's source metadata
-        document_heading = documents[0].metadata.get('source', 'Uploaded Document')
-        logger.info(f"Document Heading set to: {document_heading}")
-    else:
-        document_heading = 'No Document Loaded'
-        logger.warning("No PDF documents loaded from directory.")
-    
-    return documents
+    return [(pdf_file, CHUNKER_CONFIGS['agent_file'], lambda pdf_file=pdf_file: load_agent_file_documents(os.path.basename(pdf_file)))
+            for pdf_file in pdf_files]
 
-def process_pdf(filepath):
-    """Process a single PDF file and update the FAISS index"""
-    global retriever
-    try:
-        # Read the PDF file
-        reader = PdfReader(filepath)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        
-        # Create a document with metadata
-        doc = Document(
-            page_content=text,
-            metadata={"source": os.path.basename(filepath)}
-        )
-        
-        # Initialize or update the FAISS index
-        if retriever is None:
-            # If no retriever exists, create a new FAISS index
-            vectorstore = initialize_faiss_index([doc], embeddings)
-            retriever = vectorstore.as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 20}
-            )
-        else:
-            # If retriever exists, update the existing FAISS index
-            update_faiss_index([doc], embeddings)
-            
-        logger.info(f"Successfully processed PDF: {filepath}")
-        return True
-    except Exception as e:
-        logger.error(f"Error processing PDF {filepath}: {str(e)}")
-        return False
-
-# Initialize vector store with PDFs
-pdf_documents = load_pdfs_from_directory("backend/pdfs")
-vectorstore = initialize_faiss_index(pdf_documents, embeddings)
-retriever = vectorstore.as_retriever(
-    search_type="similarity",
-    search_kwargs={"k": 20}
-)
+def index_file_in_shared_store(file_path):
+    """Add (or replace) one file's chunks in the shared store, reusing its snapshot when unchanged"""
+    filename = os.path.basename(file_path)
+    docs, vectors = snapshot_store.load_file(
+        file_path, CHUNKER_CONFIGS['agent_file'], lambda: load_agent_file_documents(filename))
+    return shared_store.add_file(filename, docs, vectors, snapshot_store.key_for(file_path, CHUNKER_CONFIGS['agent_file']))
 
 # In-memory session storage
 sessions = {}
@@ -586,11 +595,14 @@ def format_response_with_sources(response, sources):
     print(f"[DEBUG] Final formatted response: {formatted_response[:500]}")
     return formatted_response
 
+def answer_language(user_message):
+    """Language the prompt asks the model to answer in: 'hi' for messages with Devanagari characters, else 'en'"""
+    return 'hi' if re.search(r'[\u0900-\u097F]', user_message) else 'en'
+
 def create_structured_prompt(user_message, context, doc_id=None, DOCUMENT_HEADING=None, USER_NAME=None, AGENT_ID=None):
     """Create a structured prompt using the instruction constants"""
     # Check if the message contains Hindi characters
-    hindi_pattern = re.compile(r'[\u0900-\u097F]')
-    is_hindi = bool(hindi_pattern.search(user_message))
+    is_hindi = answer_language(user_message) == 'hi'
     
     # Check if it's a pure greeting vs a question with greeting
     greeting_keywords = ['hello', 'hi', 'hey', 'good morning', 'good afternoon', 'good evening']
@@ -789,9 +801,14 @@ def load_agent_data():
 load_agent_data()
 
 # --- Agent-specific retrievers ---
-# Build a vectorstore and retriever for each agent's PDF(s)
-agent_retrievers = {}
-all_documents = []
+# Each agent's retriever is a view over the shared store, built on first use (or by its startup
+# stage) and rebuilt after the agent's sources change.
+def load_agent_retriever(agent_id):
+    """Cache loader: build the retriever for a known agent"""
+    agent = AGENTS_DATA.get(agent_id)
+    return build_agent_retriever(agent_id, agent) if agent else None
+
+agent_retrievers = AgentRetrieverCache(load_agent_retriever)
 
 # Load all PDFs and build a general retriever as fallback
 pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'pdfs')
@@ -806,114 +823,10 @@ def load_pdf_as_documents(pdf_filename):
         logger.error(f"PDF file {pdf_filename} not found in {pdf_dir}")
         return []
     try:
-        reader = PdfReader(pdf_path)
-        docs = []
-        for i, page in enumerate(reader.pages):
-            text = page.extract_text()
-            if text:
-                docs.append(Document(page_content=text, metadata={"source": pdf_filename, "page": i+1}))
-        return docs
+        return load_pdf_page_range(pdf_path)
     except Exception as e:
         logger.error(f"Error loading PDF {pdf_filename}: {e}")
         return []
-def batch_embed_and_index(docs, embeddings, batch_size=500):
-    from backend.utils import initialize_faiss_index
-    all_docs = []
-    for i in range(0, len(docs), batch_size):
-        batch = docs[i:i+batch_size]
-        # Embed the batch (but do not use precomputed_vectors)
-        # vectors = embeddings.embed_documents([doc.page_content for doc in batch])
-        all_docs.extend(batch)
-    # Now build the FAISS index with all docs (let initialize_faiss_index compute embeddings)
-    vectorstore = initialize_faiss_index(all_docs, embeddings)
-    return vectorstore
-
-# Build agent-specific retrievers (PATCH: build for all file types, not just PDFs)
-def extract_structured(file_path):
-    ext = file_path.lower().split('.')[-1]
-    try:
-        if ext == 'csv':
-            df = pd.read_csv(file_path)
-        elif ext == 'xlsx':
-            df = pd.read_excel(file_path)
-        elif ext == 'json':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = pyjson.load(f)
-            if isinstance(data, list):
-                df = pd.json_normalize(data)
-            else:
-                df = pd.json_normalize([data])
-        else:
-            raise ValueError('Unsupported structured file')
-        if df.empty:
-            logger.warning(f"Structured file {file_path} is empty.")
-            return []
-        return df.to_dict(orient='records')
-    except Exception as e:
-        logger.error(f"Failed to extract structured data from {file_path}: {e}")
-        return []
-
-def extract_text(file_path):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
-def extract_pdf(file_path):
-    extracted_text = []
-    with pdfplumber.open(file_path) as pdf:
-        for page in pdf.pages:
-            text = page.extract_text() or ''
-            if text.strip():
-                extracted_text.append(text)
-            else:
-                # Fallback: Convert page to image and run Tesseract OCR
-                pil_img = page.to_image(resolution=300).original
-                img_gray = pil_img.convert('L')
-                img_np = np.array(img_gray)
-                img_bin = cv2.adaptiveThreshold(img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
-                img_pil = Image.fromarray(img_bin)
-                ocr_text = pytesseract.image_to_string(img_pil)
-                extracted_text.append(ocr_text)
-    return '\n'.join(extracted_text)
-
-def preprocess_image_for_ocr(image):
-    img_gray = image.convert('L')
-    img_np = np.array(img_gray)
-    img_bin = cv2.adaptiveThreshold(img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
-    img_pil = Image.fromarray(img_bin)
-    if img_pil.width < 600:
-        scale = 600 / img_pil.width
-        new_size = (int(img_pil.width * scale), int(img_pil.height * scale))
-        img_pil = img_pil.resize(new_size, Image.ANTIALIAS)
-    return img_pil
-
-def extract_image(file_path, use_trocr=False):
-    try:
-        try:
-            image = Image.open(file_path).convert('RGB')
-            logger.info(f"Loaded image {file_path} with Pillow.")
-        except Exception as pil_e:
-            logger.warning(f"Pillow failed to open {file_path}: {pil_e}. Trying OpenCV...")
-            img_cv = cv2.imread(file_path)
-            if img_cv is None:
-                logger.error(f"OpenCV failed to open {file_path} as image.")
-                return ''
-            image = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
-            logger.info(f"Loaded image {file_path} with OpenCV.")
-        preprocessed = preprocess_image_for_ocr(image)
-        if not use_trocr:
-            try:
-                text = pytesseract.image_to_string(preprocessed)
-                logger.info(f"Extracted text from image {file_path} using Tesseract, length: {len(text)} chars.")
-                return text
-            except Exception as tess_e:
-                logger.error(f"Tesseract OCR failed for {file_path}: {tess_e}")
-                return ''
-        else:
-            # Add TrOCR logic here if needed
-            return ''
-    except Exception as e:
-        logger.error(f"Failed to extract text from image {file_path}: {e}")
-        return ''
 
 def extract_content(file_path, file_type, audio_transcript=None):
     ext = file_path.lower().split('.')[-1]
@@ -938,7 +851,7 @@ def extract_audio_transcript(file_path):
         logger.error("Whisper is not available for audio transcription.")
         return None
     try:
-        result = whisper_model.transcribe(file_path)
+        result = model_registry.get('whisper').transcribe(file_path)
         return result['text']
     except Exception as e:
         logger.error(f"Whisper transcription failed for {file_path}: {e}")
@@ -947,111 +860,149 @@ def extract_audio_transcript(file_path):
 
 import docx2txt
 
-for agent_id, agent in AGENTS_DATA.items():
-    pdfs = agent.get('pdfSources', [])
-    agent_docs = []
-    for filename in pdfs:
-        ext = filename.lower().split('.')[-1]
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+def source_filter_names(source):
+    """Index source names a frontend source filter matches; audio also matches its transcript .txt"""
+    names = [source]
+    if source.split('.')[-1].lower() in AUDIO_EXTENSIONS:
+        names.append(source.rsplit('.', 1)[0] + '.txt')
+    return names
+
+def get_agent_sources(agent):
+    """Return the list of source filenames configured for an agent"""
+    return agent.get('pdfSources') or agent.get('sources') or []
+
+def load_agent_file_documents(filename):
+    """Extract and chunk a single agent source file into LangChain Documents"""
+    chunk_size = CHUNKER_CONFIGS['agent_file']['chunk_size']
+    chunk_overlap = CHUNKER_CONFIGS['agent_file']['chunk_overlap']
+    ext = filename.lower().split('.')[-1]
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if ext not in AUDIO_EXTENSIONS:
+        return load_file_documents(file_path, chunk_size, chunk_overlap)
+    # Audio needs the in-process Whisper model, so it is never sent to the extraction pool
+    transcript_path = os.path.splitext(file_path)[0] + '.txt'
+    if os.path.exists(transcript_path):
+        with open(transcript_path, 'r', encoding='utf-8') as tf:
+            content = tf.read()
+        logger.info(f"Loaded transcript for {filename}, length: {len(content)} chars")
+    else:
+        # Try to generate transcript with Whisper
+        content = extract_audio_transcript(file_path)
+        if content:
+            with open(transcript_path, 'w', encoding='utf-8') as tf:
+                tf.write(content)
+            logger.info(f"Transcribed and saved transcript for {filename} at {transcript_path}")
+        else:
+            logger.warning(f"No transcript found or generated for audio file {filename}. Skipping retriever creation for this file.")
+            return []
+    docs = chunk_text(content, {"source": filename, "file_type": ext}, chunk_size, chunk_overlap)
+    logger.info(f"Created {len(docs)} document chunks for {filename}")
+    return docs
+
+def prefetch_snapshot_entries(entries):
+    """Extract every agent file that has no snapshot yet on the extraction process pool.
+
+    The extracted documents are then embedded and snapshotted in the parent, in entry order.
+    """
+    missing = [(file_path, chunker_config) for file_path, chunker_config, _ in entries
+               if chunker_config is CHUNKER_CONFIGS['agent_file']
+               and file_path.lower().split('.')[-1] not in AUDIO_EXTENSIONS
+               and not snapshot_store.has_snapshot(file_path, chunker_config)]
+    # The same file can be listed by several agents; extract it once
+    missing = list(dict.fromkeys(missing))
+    if not missing:
+        return
+    logger.info(f"Extracting {len(missing)} new or changed files on {EXTRACTION_CONFIG['workers']} worker(s)...")
+    extracted = extract_files_parallel(
+        [file_path for file_path, _ in missing],
+        chunk_size=CHUNKER_CONFIGS['agent_file']['chunk_size'],
+        chunk_overlap=CHUNKER_CONFIGS['agent_file']['chunk_overlap']
+    )
+    for file_path, chunker_config in missing:
         try:
-            logger.info(f"[STARTUP] Processing file '{filename}' (type: {ext}) for retriever...")
-            if ext == 'pdf':
-                agent_docs.extend(load_pdf_as_documents(filename))
-            elif ext in ['csv', 'xlsx', 'json']:
-                content = extract_structured(file_path)
-                if content:
-                    logger.info(f"[STARTUP] Extracted structured data from {filename}, {len(content)} rows.")
-                    import json as pyjson
-                    from langchain.text_splitter import RecursiveCharacterTextSplitter
-                    docs = []
-                    for i, row in enumerate(content):
-                        row_text = pyjson.dumps(row, ensure_ascii=False)
-                        if len(row_text) > 1000:
-                            chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(row_text)
-                            for chunk in chunks:
-                                docs.append(Document(page_content=chunk, metadata={"source": filename, "file_type": ext, "row": i}))
-                        else:
-                            docs.append(Document(page_content=row_text, metadata={"source": filename, "file_type": ext, "row": i}))
-                    logger.info(f"[STARTUP] Created {len(docs)} document chunks for {filename}")
-                    # Batch embed and index
-                    agent_vectorstore = batch_embed_and_index(docs, embeddings, batch_size=500)
-                    agent_retrievers[agent_id] = agent_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20})
-                    logger.info(f"[PATCH] Built retriever for new agent {agent_id} with {len(docs)} docs (batched embedding).")
-                    agent_docs.extend(docs)
-                else:
-                    logger.warning(f"[STARTUP] No structured data extracted from {filename} (type: {ext})")
-                    continue
-            elif ext in ['jpg', 'jpeg', 'png', 'bmp', 'webp', 'tiff']:
-                content = extract_image(file_path, use_trocr=False)
-                if content:
-                    logger.info(f"[STARTUP] Extracted text from image {filename}, length: {len(content)} chars.")
-                    from langchain.text_splitter import RecursiveCharacterTextSplitter
-                    docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                            for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                    logger.info(f"[STARTUP] Created {len(docs)} document chunks for {filename}")
-                    agent_docs.extend(docs)
-                else:
-                    logger.warning(f"[STARTUP] No text extracted from image {filename} (type: {ext})")
-            elif ext in ['mp3', 'wav', 'ogg', 'm4a']:
-                transcript_path = os.path.splitext(file_path)[0] + '.txt'
-                if os.path.exists(transcript_path):
-                    with open(transcript_path, 'r', encoding='utf-8') as tf:
-                        content = tf.read()
-                    logger.info(f"[STARTUP] Loaded transcript for {filename}, length: {len(content)} chars")
-                else:
-                    # Try to generate transcript with Whisper
-                    content = extract_audio_transcript(file_path)
-                    if content:
-                        with open(transcript_path, 'w', encoding='utf-8') as tf:
-                            tf.write(content)
-                        logger.info(f"Transcribed and saved transcript for {filename} at {transcript_path}")
-                    else:
-                        logger.warning(f"No transcript found or generated for audio file {filename}. Skipping retriever creation for this file.")
-                        continue
-                if content:
-                    from langchain.text_splitter import RecursiveCharacterTextSplitter
-                    docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                            for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                    logger.info(f"Created {len(docs)} document chunks for {filename}")
-                    agent_docs.extend(docs)
-            elif ext == 'txt':
-                content = extract_text(file_path)
-                if content:
-                    logger.info(f"[STARTUP] Extracted text from {filename}, length: {len(content)} chars.")
-                    from langchain.text_splitter import RecursiveCharacterTextSplitter
-                    docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                            for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                    logger.info(f"[STARTUP] Created {len(docs)} document chunks for {filename}")
-                    agent_docs.extend(docs)
-                else:
-                    logger.warning(f"[STARTUP] No text extracted from {filename} (type: {ext})")
-            elif ext == 'docx':
-                try:
-                    text = docx2txt.process(file_path)
-                    from langchain.text_splitter import RecursiveCharacterTextSplitter
-                    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-                    chunks = splitter.split_text(text)
-                    docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext}) for chunk in chunks]
-                    logger.info(f"[STARTUP] Created {len(docs)} document chunks for DOCX {filename}")
-                    agent_vectorstore = batch_embed_and_index(docs, embeddings, batch_size=500)
-                    agent_retrievers[agent_id] = agent_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20})
-                    logger.info(f"[PATCH] Built retriever for new agent {agent_id} with {len(docs)} docs (batched embedding, DOCX).")
-                    agent_docs.extend(docs)
-                except Exception as docx_e:
-                    logger.warning(f"[STARTUP] Failed to process DOCX {filename}: {docx_e}")
-                    continue
-            else:
-                logger.warning(f"[STARTUP] Unsupported file type for retriever: {filename} (type: {ext})")
+            snapshot_store.load_file(file_path, chunker_config, lambda docs=extracted[file_path]: docs)
         except Exception as e:
-            logger.warning(f"[STARTUP] Failed to process file {filename}: {e}")
+            logger.warning(f"Failed to index extracted file {file_path}: {e}")
+
+def agent_snapshot_entries(agent):
+    """Snapshot entries (file_path, chunker_config, loader) for every source file of an agent"""
+    entries = []
+    for filename in get_agent_sources(agent):
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        if not os.path.exists(file_path):
+            logger.warning(f"Source file {filename} for agent {agent.get('agentId')} not found in {app.config['UPLOAD_FOLDER']}")
             continue
-    all_documents.extend(agent_docs)
+        entries.append((file_path, CHUNKER_CONFIGS['agent_file'], lambda filename=filename: load_agent_file_documents(filename)))
+    return entries
+
+def build_agent_retriever(agent_id, agent):
+    """Build the retriever view for a single agent, loading any of its files missing from the shared store"""
+    for file_path, chunker_config, loader in agent_snapshot_entries(agent):
+        if not shared_store.has_source(os.path.basename(file_path)):
+            docs, vectors = snapshot_store.load_file(file_path, chunker_config, loader)
+            shared_store.add_file(os.path.basename(file_path), docs, vectors, snapshot_store.key_for(file_path, chunker_config))
+    sources = get_agent_sources(agent)
+    # 'hybridSearch' on the agent turns BM25 + vector fusion on or off (default: HYBRID_SEARCH);
+    # 'indexParams' ({"efSearch": .., "nprobe": ..}) tunes ANN search for this agent's queries
+    agent_retriever = shared_store.as_retriever(sources=sources, k=20, hybrid=agent.get('hybridSearch'),
+                                                search_params=agent.get('indexParams'))
+    if agent_retriever.allowed_ids() is None or not len(agent_retriever.allowed_ids()):
+        logger.warning(f"No documents found for agent {agent_id}. Retriever not built.")
+        return None
+    logger.info(f"Built retriever view for agent {agent_id} over {len(agent_retriever.allowed_ids())} shared chunks.")
+    return agent_retriever
+
+def shared_store_entries():
+    """Snapshot entries for every file the shared store should hold: all agent sources plus uploaded PDFs"""
+    entries = []
+    for agent in AGENTS_DATA.values():
+        entries.extend(agent_snapshot_entries(agent))
+    entries.extend(pdf_directory_snapshot_entries())
+    unique = {}
+    for entry in entries:
+        unique.setdefault(os.path.abspath(entry[0]), entry)
+    return list(unique.values())
+
+def load_shared_store(entries, progress=None):
+    """Add files missing from the shared store; each file is embedded at most once, and only if it changed"""
+    entries = [entry for entry in entries if not shared_store.has_source(os.path.basename(entry[0]))]
+    prefetch_snapshot_entries(entries)
+    for done, (file_path, chunker_config, loader) in enumerate(entries, start=1):
+        try:
+            docs, vectors = snapshot_store.load_file(file_path, chunker_config, loader)
+            shared_store.add_file(os.path.basename(file_path), docs, vectors, snapshot_store.key_for(file_path, chunker_config))
+        except Exception as e:
+            logger.warning(f"[STARTUP] Failed to load {file_path} into the shared store: {e}")
+        if progress:
+            progress(done, len(entries))
+    logger.info(f"Shared vector store ready: {shared_store.stats()}")
 
-# Build a general retriever for all documents as fallback
-general_vectorstore = initialize_faiss_index(all_documents, embeddings) if all_documents else None
-general_retriever = general_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20}) if general_vectorstore else None
+def index_uploaded_file(filename):
+    """Incrementally index an uploaded file into the shared store.
 
-ollama_client = OllamaClient()
+    Re-uploading a filename replaces its previous chunks in place; the general retriever and every
+    agent view that lists the file see the change immediately.
+    """
+    global retriever, general_retriever
+    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+    if not index_file_in_shared_store(file_path):
+        raise ValueError(f"Could not index {filename}")
+    if general_retriever is None:
+        general_retriever = shared_store.as_retriever(k=20)
+        retriever = general_retriever
+    # Agent views pick the new chunks up through the store version; nothing to rebuild
+    owning_agents = [agent_id for agent_id, agent in AGENTS_DATA.items() if filename in get_agent_sources(agent)]
+    updated = ['general'] + owning_agents
+    logger.info(f"Incrementally indexed {filename} into: {updated}")
+    return updated
+
+# The general retriever (and the legacy global retriever) search the whole shared store. Both stay
+# None until the startup stages started by create_app() have loaded it.
+vectorstore = shared_store
+general_retriever = None
+retriever = None
+
+ollama_client = LazyModel(model_registry, 'ollama')
 
 @app.route('/sessions/<session_id>/messages', methods=['POST'])
 def add_message(session_id):
@@ -1068,31 +1019,108 @@ def add_message(session_id):
     original_message = data.get('original_message', user_message)  # Optionally store original message for display
     lang = data.get('lang', 'en-IN')  # Default to BCP-47 code
     model_name = data.get('model', 'gemini')
+    rerank_budget_ms = None
+    if data.get('rerankBudgetMs') is not None:
+        try:
+            rerank_budget_ms = bounded_number(data['rerankBudgetMs'], 'rerankBudgetMs', 1, MAX_RERANK_BUDGET_MS, float)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    # 'agentIds' with two or more agents searches all of their indexes (federated mode)
+    federated_ids = list(dict.fromkeys(data.get('agentIds') or []))
+    unknown = [a for a in federated_ids if a not in AGENTS_DATA]
+    if unknown:
+        return jsonify({'error': f"Unknown agents: {', '.join(map(str, unknown))}"}), 404
+    if len(federated_ids) > FEDERATED_CONFIG['max_indexes']:
+        return jsonify({'error': f"At most {FEDERATED_CONFIG['max_indexes']} agents per federated search"}), 400
+    if len(federated_ids) < 2:
+        federated_ids = []
+    # Caches treat a federated request as its own agent, so its answers never mix with single-agent ones
+    cache_agent = federated_cache_agent(federated_ids) if federated_ids else agent_id
     
     logger.info(f"Processing user message: {user_message} for agent: {agent_id}, source: {source_from_frontend}")
+
+    # Fail fast while this agent's index (or the general one) is still warming up
+    stages = [index_stage_for(a) for a in federated_ids] or [index_stage_for(agent_id)]
+    stage = next((name for name in stages if not startup.is_settled(name)), None)
+    if stage is not None:
+        logger.info(f"Index stage {stage} still warming up; asking the client to retry")
+        response = jsonify({'error': 'Index is still loading, please retry shortly.', 'stage': stage, 'startup': startup.report()['stages'].get(stage)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_CONFIG['retry_after_seconds'])
+        return response
+
+    # Identical question against an unchanged index: reuse the finished answer
+    bypass_cache = bool(data.get('bypassCache'))
+    index_version = ([index_version_for(a, source_from_frontend) for a in federated_ids] if federated_ids
+                     else index_version_for(agent_id, source_from_frontend))
+    cache_key = response_cache_key(cache_agent, source_from_frontend, model_name, normalize_query(user_message), index_version)
+    if bypass_cache:
+        response_cache.record_bypass()
+    else:
+        cached_answer = response_cache.get(cache_key)
+        if cached_answer is not None:
+            logger.info(f"Answer cache hit for agent {agent_id}, model {model_name}")
+            return complete_message(session_id, data, user_message, original_message, agent_id, lang, answer_for_request(cached_answer, user_name, 'exact'))
+
+    # A paraphrase of an earlier question whose cited chunks are unchanged: reuse that answer
+    query_vector = None
+    if not bypass_cache and SEMANTIC_CACHE_CONFIG['enabled']:
+        query_vector = embeddings.embed_query(user_message)  # Shared with retrieval via the query embedding cache
+        cached_answer, similarity = semantic_cache.lookup(cache_agent, model_name, source_from_frontend, user_message,
+                                                         query_vector, answer_language(user_message))
+        if cached_answer is not None:
+            logger.info(f"Semantic answer cache hit for agent {agent_id} (similarity {similarity:.3f})")
+            return complete_message(session_id, data, user_message, original_message, agent_id, lang, answer_for_request(cached_answer, user_name, 'semantic'))
+    generation_started = time.time()
     
-    # Use agent-specific retriever if available, else fallback to general retriever
-    retriever_to_use = agent_retrievers.get(agent_id) if agent_id in agent_retrievers else general_retriever
-    if retriever_to_use is None:
-        logger.error("No retriever available for this agent or general context.")
-        return jsonify({'error': 'No retriever available.'}), 500
-    all_docs = retriever_to_use.get_relevant_documents(user_message)
-    logger.info(f"Retrieved {len(all_docs)} documents for agent {agent_id if agent_id else 'general'}.")
-    # Filter by selected source if provided
-    if source_from_frontend:
-        # If the selected source is an audio file, map to its transcript txt file
-        audio_exts = ['mp3', 'wav', 'ogg', 'm4a']
-        ext = source_from_frontend.split('.')[-1].lower()
-        if ext in audio_exts:
-            transcript_name = source_from_frontend.rsplit('.', 1)[0] + '.txt'
-            docs = [doc for doc in all_docs if doc.metadata.get('source') == transcript_name]
-            logger.info(f"Filtered docs to transcript for audio source '{source_from_frontend}' (using '{transcript_name}'): {len(docs)} remaining.")
-        else:
-            docs = [doc for doc in all_docs if doc.metadata.get('source') == source_from_frontend]
-            logger.info(f"Filtered docs to selected source '{source_from_frontend}': {len(docs)} remaining.")
+    if federated_ids:
+        # Cross-agent question: every agent's view is searched in parallel and merged by normalized score
+        merged, _ = federated_retrieve(federated_ids, user_message, source_from_frontend)
+        docs = [doc for doc, _, _ in merged]
     else:
-        docs = all_docs
+        # Use agent-specific retriever if available, else fallback to general retriever
+        retriever_to_use = agent_retrievers.get(agent_id) if agent_id in AGENTS_DATA else None
+        if retriever_to_use is None:
+            retriever_to_use = general_retriever
+        if retriever_to_use is None:
+            logger.error("No retriever available for this agent or general context.")
+            return jsonify({'error': 'No retriever available.'}), 500
+        # Scope the search itself to the selected source, so a small file still yields a full top-k
+        if source_from_frontend:
+            scope = source_filter_names(source_from_frontend)
+            retriever_to_use = retriever_to_use.scoped(scope)
+            logger.info(f"Searching only within selected source(s) {scope}")
+        docs = retriever_to_use.get_relevant_documents(user_message)
+    logger.info(f"Retrieved {len(docs)} documents for agent {', '.join(federated_ids) or agent_id or 'general'}.")
     logger.info(f"Documents returned: {[doc.metadata.get('source') for doc in docs]}")
+
+    # Keep only as many chunks as their similarity to the question justifies (the agent's 'adaptiveK'
+    # dict can override threshold / gap / minK / maxK, or set "enabled": false)
+    agent_config = AGENTS_DATA.get(agent_id, {})
+    adaptive_config = agent_config.get('adaptiveK') or {}
+    adaptive_k = None
+    if adaptive_config.get('enabled', ADAPTIVE_K_CONFIG['enabled']) and len(docs) > 1:
+        if query_vector is None:
+            query_vector = embeddings.embed_query(user_message)  # Query-cache hit from retrieval
+        similarities = chunk_similarities(docs, query_vector)
+        if similarities is not None:
+            docs = adaptive_top_k.select(docs, similarities, adaptive_config, agent_id)
+            adaptive_k = len(docs)
+
+    # Optional cross-encoder precision pass ('crossEncoderRerank' on the agent, or CROSS_ENCODER_RERANK);
+    # within its budget it keeps the top-n, otherwise retrieval order stands
+    cross_encoded = False
+    if agent_config.get('crossEncoderRerank', CROSS_ENCODER_CONFIG['default_enabled']):
+        docs, cross_encoded = cross_encoder.rerank(user_message, docs, agent_config.get('crossEncoderTopN'),
+                                                   rerank_budget_ms, agent_id)
+
+    # Drop near-duplicate chunks (overlapping splits of one page) before they reach the prompt; a
+    # cross-encoder ranking is kept as is. MMR keeps as many chunks as adaptive top-k chose.
+    if not cross_encoded:
+        docs = diversify_documents(docs, user_message, query_vector, agent_config.get('mmr'), adaptive_k)
+    # Chunks users rated well come first
+    docs = feedback_scores.rerank(docs)
     
     # Build context with source metadata for each chunk
     def format_source(doc):
@@ -1106,6 +1134,9 @@ def add_message(session_id):
             meta += f", Section: {section}"
         meta += "]"
         return f"{meta}\n{doc.page_content}"
+    # Merge neighbouring chunks, drop duplicates and stop at the model's context token budget
+    docs, context_report = build_context_documents(docs, token_budget(model_name))
+    logger.info(f"Context for {model_name}: {context_report}")
     context = "\n\n".join([format_source(doc) for doc in docs])
     # Escape curly braces in the context to prevent them from being misinterpreted as variables by Langchain
     escaped_context = context.replace('{', '{{').replace('}', '}}')
@@ -1382,7 +1413,7 @@ REMEMBER: Start your answer with \"Thank you for asking. As per the information
         chain = (
             {"context": RunnablePassthrough(), "user_message": RunnablePassthrough()}
             | ChatPromptTemplate.from_template(prompt_data["prompt"])
-            | llm
+            | model_registry.get('gemini')
             | StrOutputParser()
         )
         # Generate response
@@ -1415,12 +1446,52 @@ REMEMBER: Start your answer with \"Thank you for asking. As per the information
     logger.info(f"Formatted sources after processing: {formatted_response.split('**Sources:**')[1] if '**Sources:**' in formatted_response else 'No sources block'}")
     
     # Log the formatted response (first 500 chars)
+    answer_ok = formatted_response is not None
     if formatted_response is None:
         logger.error("Received None response from format_response_with_sources")
         formatted_response = "I apologize, but I encountered an error while processing your request. Please try again."
     else:
         logger.info(f"Formatted response (first 500 chars): {formatted_response[:500]}...")
     
+    answer = {
+        'response': formatted_response,
+        'query_type': prompt_data['query_type'],
+        'metadata': prompt_data['metadata'],
+        'model_used': model_used,
+        'source_highlights': [doc.page_content for doc in docs if doc.page_content],
+        'sources': [format_source(doc) for doc in docs],
+        # Sent back with feedback as documentChunkIds so ratings reach the chunks behind this answer
+        'documentChunkIds': [chunk_id for doc in docs for chunk_id in doc_chunk_ids(doc)],
+        'cache_hit': None
+    }
+    if answer_ok and not bypass_cache:
+        shared_answer = cacheable_answer(answer)
+        response_cache.put(cache_key, cache_agent, shared_answer)
+        cited_chunk_ids = answer['documentChunkIds']
+        # Answers citing nothing are not reused: new uploads could make them answerable
+        if SEMANTIC_CACHE_CONFIG['enabled'] and query_vector is not None and cited_chunk_ids:
+            semantic_cache.store(cache_agent, model_name, source_from_frontend, user_message, query_vector, shared_answer,
+                                 cited_chunk_ids, time.time() - generation_started, answer_language(user_message))
+    return complete_message(session_id, data, user_message, original_message, agent_id, lang, answer)
+
+# Answer metadata that belongs to the asking user: never cached, filled in from each request instead
+PER_USER_METADATA = ('user_name',)
+
+def cacheable_answer(answer):
+    """The answer as the response and semantic caches keep it, shared by every user"""
+    metadata = {key: value for key, value in (answer.get('metadata') or {}).items() if key not in PER_USER_METADATA}
+    return dict(answer, metadata=metadata)
+
+def answer_for_request(cached_answer, user_name, cache_hit):
+    """A cached answer completed with the current user's fields"""
+    return dict(cached_answer, metadata=dict(cached_answer.get('metadata') or {}, user_name=user_name), cache_hit=cache_hit)
+
+def complete_message(session_id, data, user_message, original_message, agent_id, lang, answer):
+    """Record a user message and its answer in the session, log usage and build the chat response.
+
+    `answer` holds the fields that depend only on the question and the index (response text,
+    query_type, metadata, model_used, source_highlights, sources), so it can come from the cache.
+    """
     # Add messages to session
     sessions[session_id]['messages'].append({
         'sender': 'user',
@@ -1430,10 +1501,11 @@ REMEMBER: Start your answer with \"Thank you for asking. As per the information
     })
     sessions[session_id]['messages'].append({
         'sender': 'assistant',
-        'content': str(formatted_response), # Ensure assistant response is always a string
+        'content': str(answer['response']), # Ensure assistant response is always a string
         'agentId': agent_id, # Store the agent ID for assistant messages as well
         'lang': lang,  # Store BCP-47 code
-        'model_used': model_used  # Store the model used for this response
+        'model_used': answer['model_used'],  # Store the model used for this response
+        'documentChunkIds': answer.get('documentChunkIds', [])  # Sent back with feedback on this answer
     })
     
     # Log monitoring data
@@ -1444,7 +1516,7 @@ REMEMBER: Start your answer with \"Thank you for asking. As per the information
         # Log model usage
         log_model_usage(
             user_email=user_email,
-            model_name=model_used,
+            model_name=answer['model_used'],
             session_id=session_id,
             agent_id=agent_id,
             response_time=None,  # Could be calculated if we track timing
@@ -1506,24 +1578,18 @@ REMEMBER: Start your answer with \"Thank you for asking. As per the information
 
     save_sessions() # Save sessions after adding a message or updating title
     
-    # After docs are retrieved, get source highlights
-    source_highlights = [doc.page_content for doc in docs if doc.page_content]
-    
     # Remove markdown source links from main answer text before sending to frontend
+    formatted_response = answer['response']
     if formatted_response and '**Sources:**' in formatted_response:
         main_answer, sources_section = formatted_response.split('**Sources:**', 1)
         main_answer = re.sub(r'\(pdf://[^\)]+\)', '', main_answer).strip()
         formatted_response = f"{main_answer}\n\n**Sources:**{sources_section}"
     
     return jsonify({
+        **answer,
         'response': formatted_response,
-        'query_type': prompt_data['query_type'],
-        'metadata': prompt_data['metadata'],
         'session': sessions[session_id],
-        'agentId': agent_id,
-        'model_used': model_used,
-        'source_highlights': source_highlights,
-        'sources': [format_source(doc) for doc in docs]
+        'agentId': agent_id
     })
 
 # Add route to serve PDF files
@@ -1562,16 +1628,6 @@ ALLOWED_EXTENSIONS = {'pdf'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Add this function to rebuild the FAISS index from all PDFs in the upload folder
-def rebuild_faiss_index():
-    global retriever
-    pdf_documents = load_pdfs_from_directory(app.config['UPLOAD_FOLDER'])
-    vectorstore = initialize_faiss_index(pdf_documents, embeddings)
-    retriever = vectorstore.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 20}
-    )
-
 @app.route('/upload-pdf', methods=['POST', 'OPTIONS'])
 def upload_pdf():
     """Handle PDF file uploads (multiple files supported)"""
@@ -1601,16 +1657,17 @@ def upload_pdf():
                 logger.error(f"Invalid file type: {file.filename}")
                 return jsonify({'error': f'Invalid file type: {file.filename}', 'success': False}), 400
         try:
-            logger.info(f"Rebuilding FAISS index after uploading: {saved_filenames}")
-            rebuild_faiss_index()
-            logger.info(f"FAISS index rebuilt successfully after uploading: {saved_filenames}")
+            logger.info(f"Incrementally indexing uploaded files: {saved_filenames}")
+            updated_indexes = {filename: index_uploaded_file(filename) for filename in saved_filenames}
+            logger.info(f"FAISS indexes updated successfully after uploading: {saved_filenames}")
             return jsonify({
                 'message': 'Files uploaded and processed successfully',
                 'filenames': saved_filenames,
+                'updated_indexes': updated_indexes,
                 'success': True
             })
         except Exception as e:
-            logger.error(f"Error during FAISS index rebuild: {str(e)}")
+            logger.error(f"Error during incremental FAISS index update: {str(e)}")
             # Remove all uploaded files if processing fails
             for filename in saved_filenames:
                 filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
@@ -1621,54 +1678,277 @@ def upload_pdf():
         logger.error(f"Unexpected error in upload_pdf route: {str(e)}")
         return jsonify({'error': f'Unexpected error: {str(e)}', 'success': False}), 500
 
-# Load PDFs from uploads directory on startup
-def load_uploaded_pdfs():
-    global retriever # Declare retriever as global to modify it
-    existing_pdfs_in_index = set()
+class FallbackRetriever:
+    def get_relevant_documents(self, query):
+        logger.warning("Using FallbackRetriever: No documents indexed. Query will not have context.")
+        return []
 
-    # Try to load existing FAISS index to get sources
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")  # Multilingual support
-    if os.path.exists("faiss_index"):
-        try:
-            vectorstore = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
-            # Extract existing sources from metadata (this might be tricky without iterating all docs)
-            # For simplicity, we'll assume if it's in the folder, we should try to process it
-            retriever = vectorstore.as_retriever()
-            logger.info("Existing FAISS index loaded.")
-        except Exception as e:
-            logger.warning(f"Error loading existing FAISS index: {e}. A new index will be created if needed.")
-            retriever = None # Reset retriever if loading fails
+# --- Startup stages ---
+# Indexing runs on a background thread started by create_app(), so HTTP (and /healthz) is up
+# immediately. Each agent's files load first, in their own stage, then everything else.
+startup = StartupTracker()
+
+def index_version_for(agent_id, source=None):
+    """Versions of the sources an answer for this agent/source filter is built from; part of the answer cache key"""
+    if source:
+        sources = source_filter_names(source)
+    elif agent_id in AGENTS_DATA:
+        sources = get_agent_sources(AGENTS_DATA[agent_id])
     else:
-        logger.info("No existing FAISS index found. A new one will be created.")
-        retriever = None
-
-    # Process all PDFs in the UPLOAD_FOLDER
-    if os.path.exists(UPLOAD_FOLDER):
-        for filename in os.listdir(UPLOAD_FOLDER):
-            if filename.endswith('.pdf'):
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
-                if retriever is None or filename not in existing_pdfs_in_index: # Only process if new or retriever is not initialized
-                    try:
-                        process_pdf(filepath) # This will update the global retriever
-                        logger.info(f"Loaded PDF: {filename}")
-                    except Exception as e:
-                        logger.error(f"Error loading PDF {filename}: {str(e)}")
-    
+        return shared_store.version
+    return sorted((name, shared_store.source_versions.get(name, 0)) for name in sources)
+
+def index_stage_for(agent_id):
+    """Name of the startup stage a chat request for this agent waits on"""
+    return f"agent:{agent_id}" if agent_id in AGENTS_DATA else 'global_index'
+
+def warm_persisted_index(progress):
+    """Startup stage: map the index another process (or the last run) persisted, keeping only unchanged sources"""
+    if not INDEX_CONFIG['persist'] or not shared_store.load_persisted():
+        return
+    current_keys = {os.path.basename(file_path): snapshot_store.key_for(file_path, chunker_config)
+                    for file_path, chunker_config, _ in shared_store_entries()}
+    shared_store.retain_sources(current_keys)
+
+def persist_shared_store():
+    """Save the shared index for other workers and restarts if it changed since it was last saved or loaded"""
+    if INDEX_CONFIG['persist'] and shared_store.version != shared_store.persisted_version:
+        shared_store.persist()
+
+def warm_agent_index(agent_id, progress):
+    """Startup stage: load one agent's files into the shared store and build its retriever view"""
+    agent = AGENTS_DATA.get(agent_id)
+    if not agent:
+        return
+    load_shared_store(agent_snapshot_entries(agent), progress)
+    agent_retrievers.get(agent_id)
+
+def warm_global_index(progress):
+    """Startup stage: load every remaining file and build the general retriever"""
+    global retriever, general_retriever, document_heading
+    # Every file is extracted (in parallel, if cold), embedded at most once and added to the shared store
+    load_shared_store(shared_store_entries(), progress)
+    if shared_store.index is not None:
+        general_retriever = shared_store.as_retriever(k=20)
+        retriever = general_retriever
+    # The heading comes from the store's source names; no file is reloaded or re-chunked for it
+    pdf_sources = sorted(source for source in shared_store.sources() if source.lower().endswith('.pdf'))
+    document_heading = pdf_sources[0] if pdf_sources else 'No Document Loaded'
+    logger.info(f"Document Heading set to: {document_heading}")
+    # Everything is loaded: move to HNSW/IVF (and SQ8/PQ codes) if the corpus size or FAISS_INDEX_TYPE / FAISS_QUANTIZATION call for it
+    shared_store.optimize_index()
+    persist_shared_store()
+
+    # Startup indexing is done; the vectors now live in the indexes and in the on-disk snapshots
+    snapshot_store.release_memory()
+    logger.info(f"Snapshot store stats after startup: {snapshot_store.stats}")
+
+    # If no PDFs were found, `retriever` will remain None; use a mock.
     if retriever is None:
-        logger.warning("No PDFs processed and no retriever initialized. Chat functionality may be limited.")
+        logger.warning("Retriever is still None after loading PDFs. Initializing a mock retriever.")
+        retriever = FallbackRetriever()
+
+def warm_model(name, progress):
+    """Startup stage: load a model from the registry ahead of its first use"""
+    model_registry.get(name)
+
+def startup_stages():
+    """The ordered (name, func) startup stages: warm-up models, the persisted index, each agent's index, then the general index"""
+    stages = [(f"model:{name}", lambda progress, name=name: warm_model(name, progress))
+              for name in MODEL_REGISTRY_CONFIG['warm_up'] if name != 'whisper']
+    stages.append(('persisted_index', warm_persisted_index))
+    stages += [(f"agent:{agent_id}", lambda progress, agent_id=agent_id: warm_agent_index(agent_id, progress))
+               for agent_id in list(AGENTS_DATA.keys())]
+    stages.append(('global_index', warm_global_index))
+    return stages
+
+def create_app():
+    """Start the background startup stages and return the Flask app; HTTP can be served immediately."""
+    seed_feedback_scores()
+    # Whisper is not needed to answer chats, so it is warmed last and never blocks readiness
+    startup.add('model:whisper', required=False)
+    if not WHISPER_AVAILABLE:
+        startup.skip('model:whisper', 'openai-whisper is not installed')
+    elif 'whisper' not in MODEL_REGISTRY_CONFIG['warm_up']:
+        startup.skip('model:whisper', 'loads on first transcription')
+    startup.start(startup_stages() + [('model:whisper', lambda progress: warm_model('whisper', progress))])
+    return app
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """Liveness: the process is up and serving HTTP"""
+    return jsonify({'status': 'ok', 'uptime_seconds': startup.report()['uptime_seconds']})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    """Readiness: per-stage startup progress; 503 until every required stage is ready"""
+    report = startup.report()
+    report['models'] = model_registry.stats()
+    response = jsonify(report)
+    if not report['ready']:
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_CONFIG['retry_after_seconds'])
+    return response
+
+def chunk_similarities(docs, query_vector):
+    """Cosine similarity of each retrieved chunk's stored vector to the query (None if a chunk is not in the store)"""
+    doc_vectors = shared_store.document_vectors(docs)
+    if doc_vectors is None:
+        return None
+    return cosine_similarities(query_vector, doc_vectors).tolist()
 
-# Call this function on startup
-load_uploaded_pdfs()
-
-# Initialize global retriever after load_uploaded_pdfs has potentially set it
-# If no PDFs were found, `retriever` will remain None or be a mock.
-if retriever is None:
-    logger.warning("Retriever is still None after loading PDFs. Initializing a mock retriever.")
-    class FallbackRetriever:
-        def get_relevant_documents(self, query):
-            logger.warning("Using FallbackRetriever: No documents indexed. Query will not have context.")
-            return []
-    retriever = FallbackRetriever()
+def diversify_documents(docs, query, query_vector=None, overrides=None, output_size=None):
+    """MMR re-rank of retrieved chunks using their stored vectors (no re-embedding).
+
+    `overrides` is an agent's optional {"lambda": .., "outputSize": .., "enabled": ..}; `output_size`
+    (the adaptive top-k) takes precedence over its outputSize.
+    """
+    overrides = overrides or {}
+    if not overrides.get('enabled', MMR_CONFIG['enabled']) or len(docs) <= 1:
+        return docs
+    doc_vectors = shared_store.document_vectors(docs)
+    if doc_vectors is None:
+        return docs
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query)  # Usually a query-cache hit from retrieval
+    started = time.time()
+    diversified = mmr_documents(docs, query_vector, doc_vectors, output_size or overrides.get('outputSize'),
+                                overrides.get('lambda'))
+    logger.info(f"MMR kept {len(diversified)} of {len(docs)} chunks in {(time.time() - started) * 1000:.1f}ms")
+    return diversified
+
+def federated_retrieve(agent_ids, query, source=None, k=20):
+    """Search several agents' views concurrently (no combined index) and merge them by normalized score.
+
+    Returns ([(Document, normalized score, agent id)], {agent id: timing}).
+    """
+    views = {}
+    for agent_id in agent_ids:
+        view = agent_retrievers.get(agent_id) if agent_id in AGENTS_DATA else None
+        if view is None:
+            continue
+        views[agent_id] = view.scoped(source_filter_names(source)) if source else view
+    if not views:
+        return [], {}
+    return federated_search(views, query, k)
+
+@app.route('/search/federated', methods=['POST'])
+def search_federated():
+    """Merged chunks with normalized scores and per-agent timing for one query across several agents"""
+    data = request.json or {}
+    query = str(data.get('query') or '')
+    agent_ids = list(dict.fromkeys(data.get('agentIds') or []))
+    if not query or not agent_ids:
+        return jsonify({'error': 'query and a list of agentIds are required'}), 400
+    if len(agent_ids) > FEDERATED_CONFIG['max_indexes']:
+        return jsonify({'error': f"At most {FEDERATED_CONFIG['max_indexes']} agents per federated search"}), 400
+    try:
+        k = bounded_number(data.get('k', 20), 'k', 1, MAX_SEARCH_K)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    unknown = [a for a in agent_ids if a not in AGENTS_DATA]
+    if unknown:
+        return jsonify({'error': f"Unknown agents: {', '.join(map(str, unknown))}"}), 404
+    pending = [index_stage_for(a) for a in agent_ids if not startup.is_settled(index_stage_for(a))]
+    if pending:
+        response = jsonify({'error': 'Index is still loading, please retry shortly.', 'stages': pending})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_CONFIG['retry_after_seconds'])
+        return response
+    if not any(agent_retrievers.get(a) is not None for a in agent_ids):
+        return jsonify({'error': 'No retriever available.'}), 503
+    merged, timings = federated_retrieve(agent_ids, query, data.get('source'), k)
+    return jsonify({
+        'results': [{
+            'agentId': name,
+            'chunkId': doc.metadata.get('chunk_id'),
+            'source': doc.metadata.get('source'),
+            'page': doc.metadata.get('page'),
+            'score': round(score, 4),
+            'content': doc.page_content
+        } for doc, score, name in merged],
+        'timings': timings
+    })
+
+MAX_BATCH_SEARCH_QUERIES = int(os.getenv('MAX_BATCH_SEARCH_QUERIES', 1000))
+MAX_SEARCH_K = int(os.getenv('MAX_SEARCH_K', 200))
+MAX_RERANK_BUDGET_MS = float(os.getenv('MAX_RERANK_BUDGET_MS', 10000))
+
+def bounded_number(value, name, minimum, maximum, cast=int):
+    """Parse a request field as a number in [minimum, maximum]; raises ValueError with a message for the client"""
+    try:
+        if isinstance(value, bool):
+            raise ValueError
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number between {minimum} and {maximum}")
+    if not minimum <= number <= maximum:
+        raise ValueError(f"{name} must be a number between {minimum} and {maximum}")
+    return number
+
+def batch_search(queries, agent_id=None, source=None, k=20):
+    """Retrieve for many queries at once: one embedding batch and one multi-row FAISS search.
+
+    Uses the agent's view (or the whole store), narrowed to `source` if given, and returns one
+    [(Document, L2 distance)] list per query. Dense only, even for hybrid agents.
+    """
+    view = agent_retrievers.get(agent_id) if agent_id in AGENTS_DATA else None
+    if view is None:
+        view = general_retriever
+    if view is None or not hasattr(view, 'batch_search'):
+        raise LookupError('No retriever available.')
+    if source:
+        view = view.scoped(source_filter_names(source))
+    return view.batch_search(queries, k)
+
+@app.route('/search/batch', methods=['POST'])
+def search_batch():
+    """Ranked chunks with scores for a list of queries, e.g. for evaluation sweeps and cache pre-warming"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    queries = data.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, str) for query in queries):
+        return jsonify({'error': 'queries must be a non-empty list of strings'}), 400
+    agent_id = data.get('agentId')
+    source = data.get('source')
+    try:
+        k = bounded_number(data.get('k', 20), 'k', 1, MAX_SEARCH_K)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if len(queries) > MAX_BATCH_SEARCH_QUERIES:
+        return jsonify({'error': f'At most {MAX_BATCH_SEARCH_QUERIES} queries per batch'}), 400
+    if agent_id is not None and not isinstance(agent_id, str):
+        return jsonify({'error': 'agentId must be a string'}), 400
+    if agent_id and agent_id not in AGENTS_DATA:
+        return jsonify({'error': f'Agent {agent_id} not found'}), 404
+    stage = index_stage_for(agent_id)
+    if not startup.is_settled(stage):
+        response = jsonify({'error': 'Index is still loading, please retry shortly.', 'stage': stage})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STARTUP_CONFIG['retry_after_seconds'])
+        return response
+    started = time.time()
+    try:
+        results = batch_search(queries, agent_id, source, k)
+    except LookupError as e:
+        return jsonify({'error': str(e)}), 503
+    elapsed = time.time() - started
+    logger.info(f"Batch search: {len(queries)} queries for agent {agent_id or 'general'} in {elapsed:.3f}s")
+    return jsonify({
+        'results': [{
+            'query': query,
+            'chunks': [{
+                'chunkId': doc.metadata.get('chunk_id'),
+                'source': doc.metadata.get('source'),
+                'page': doc.metadata.get('page'),
+                'score': distance,
+                'content': doc.page_content
+            } for doc, distance in hits]
+        } for query, hits in zip(queries, results)],
+        'seconds': round(elapsed, 3),
+        'queries_per_second': round(len(queries) / elapsed, 1) if elapsed else None
+    })
 
 # Agent management endpoints
 @app.route('/agents', methods=['GET'])
@@ -1728,114 +2008,17 @@ def add_agent():
         logger.info(f"Added new agent: {agent_id}")
 
         # --- PATCH START: Build retriever for new agent ---
-        # Load PDFs and build retriever for the new agent
-        pdfs = agent_data.get('pdfSources', [])
-        agent_docs = []
-        for filename in pdfs:
-            ext = filename.lower().split('.')[-1]
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            try:
-                logger.info(f"Processing file '{filename}' (type: {ext}) for retriever...")
-                if ext == 'pdf':
-                    agent_docs.extend(load_pdf_as_documents(filename))
-                elif ext in ['csv', 'xlsx', 'json']:
-                    content = extract_structured(file_path)
-                    if content:
-                        logger.info(f"Extracted structured data from {filename}, {len(content)} rows.")
-                        import json as pyjson
-                        from langchain.text_splitter import RecursiveCharacterTextSplitter
-                        docs = []
-                        for i, row in enumerate(content):
-                            row_text = pyjson.dumps(row, ensure_ascii=False)
-                            if len(row_text) > 1000:
-                                chunks = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(row_text)
-                                for chunk in chunks:
-                                    docs.append(Document(page_content=chunk, metadata={"source": filename, "file_type": ext, "row": i}))
-                            else:
-                                docs.append(Document(page_content=row_text, metadata={"source": filename, "file_type": ext, "row": i}))
-                        logger.info(f"Created {len(docs)} document chunks for {filename}")
-                        # Batch embed and index
-                        agent_vectorstore = batch_embed_and_index(docs, embeddings, batch_size=500)
-                        agent_retrievers[agent_id] = agent_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20})
-                        logger.info(f"[PATCH] Built retriever for new agent {agent_id} with {len(docs)} docs (batched embedding).")
-                        agent_docs.extend(docs)
-                    else:
-                        logger.warning(f"No structured data extracted from {filename} (type: {ext})")
-                        continue
-                elif ext in ['jpg', 'jpeg', 'png', 'bmp', 'webp', 'tiff']:
-                    content = extract_image(file_path, use_trocr=False)
-                    if content:
-                        logger.info(f"Extracted text from image {filename}, length: {len(content)} chars.")
-                        from langchain.text_splitter import RecursiveCharacterTextSplitter
-                        docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                                for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                        logger.info(f"Created {len(docs)} document chunks for {filename}")
-                        agent_docs.extend(docs)
-                    else:
-                        logger.warning(f"No text extracted from image {filename} (type: {ext})")
-                elif ext in ['mp3', 'wav', 'ogg', 'm4a']:
-                    transcript_path = os.path.splitext(file_path)[0] + '.txt'
-                    if os.path.exists(transcript_path):
-                        with open(transcript_path, 'r', encoding='utf-8') as tf:
-                            content = tf.read()
-                        logger.info(f"Loaded transcript for {filename}, length: {len(content)} chars")
-                    else:
-                        # Try to generate transcript with Whisper
-                        content = extract_audio_transcript(file_path)
-                        if content:
-                            with open(transcript_path, 'w', encoding='utf-8') as tf:
-                                tf.write(content)
-                            logger.info(f"Transcribed and saved transcript for {filename} at {transcript_path}")
-                        else:
-                            logger.warning(f"No transcript found or generated for audio file {filename}. Skipping retriever creation for this file.")
-                            continue
-                    if content:
-                        from langchain.text_splitter import RecursiveCharacterTextSplitter
-                        docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                                for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                        logger.info(f"Created {len(docs)} document chunks for {filename}")
-                        agent_docs.extend(docs)
-                elif ext == 'txt':
-                    content = extract_text(file_path)
-                    if content:
-                        logger.info(f"Extracted text from {filename}, length: {len(content)} chars.")
-                        from langchain.text_splitter import RecursiveCharacterTextSplitter
-                        docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext})
-                                for chunk in RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100).split_text(content) if chunk.strip()]
-                        logger.info(f"Created {len(docs)} document chunks for {filename}")
-                        agent_docs.extend(docs)
-                    else:
-                        logger.warning(f"No text extracted from {filename} (type: {ext})")
-                elif ext == 'docx':
-                    try:
-                        text = docx2txt.process(file_path)
-                        from langchain.text_splitter import RecursiveCharacterTextSplitter
-                        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-                        chunks = splitter.split_text(text)
-                        docs = [Document(page_content=chunk, metadata={"source": filename, "file_type": ext}) for chunk in chunks]
-                        logger.info(f"[STARTUP] Created {len(docs)} document chunks for DOCX {filename}")
-                        agent_vectorstore = batch_embed_and_index(docs, embeddings, batch_size=500)
-                        agent_retrievers[agent_id] = agent_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20})
-                        logger.info(f"[PATCH] Built retriever for new agent {agent_id} with {len(docs)} docs (batched embedding, DOCX).")
-                        agent_docs.extend(docs)
-                    except Exception as docx_e:
-                        logger.warning(f"[STARTUP] Failed to process DOCX {filename}: {docx_e}")
-                        continue
-                else:
-                    logger.warning(f"Unsupported file type for retriever: {filename} (type: {ext})")
-            except Exception as e:
-                logger.error(f"Error extracting/processing {filename} (type: {ext}): {e}")
-            if agent_docs:
-                agent_vectorstore = initialize_faiss_index(agent_docs, embeddings)
-                agent_retrievers[agent_id] = agent_vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": 20})
-                logger.info(f"Built retriever for agent {agent_id} with {len(agent_docs)} docs.")
-            else:
-                logger.warning(f"[PATCH] No documents found for new agent {agent_id}. Retriever not built.")
-            return jsonify({
-                'message': 'Agent created successfully',
-                'agent': agent_data,
-                'success': True
-            }), 201
+        # Load the agent's files into the shared store now; its retriever view is built on first query
+        try:
+            load_shared_store(agent_snapshot_entries(agent_data))
+            agent_retrievers.invalidate(agent_id)
+        except Exception as e:
+            logger.error(f"Error building retriever for agent {agent_id}: {e}")
+        return jsonify({
+            'message': 'Agent created successfully',
+            'agent': agent_data,
+            'success': True
+        }), 201
     except Exception as e:
         logger.error(f"Error adding agent: {str(e)}")
         return jsonify({'error': f'Error adding agent: {str(e)}', 'success': False}), 500
@@ -1853,6 +2036,9 @@ def update_agent(agent_id):
     data = request.json
     AGENTS_DATA[agent_id].update(data) # Update the agent data
     save_agents_to_json() # Save changes to JSON file
+    agent_retrievers.invalidate(agent_id) # Sources may have changed; rebuild on next query
+    response_cache.invalidate_agent(agent_id) # Prompt or sources may have changed
+    semantic_cache.invalidate_agent(agent_id)
     logger.info(f"Updated agent: {agent_id}")
     return jsonify(AGENTS_DATA[agent_id])
 
@@ -1871,6 +2057,9 @@ def delete_agent(agent_id):
         
         # Delete the agent from AGENTS_DATA
         del AGENTS_DATA[agent_id]
+        agent_retrievers.invalidate(agent_id)
+        response_cache.invalidate_agent(agent_id)
+        semantic_cache.invalidate_agent(agent_id)
         
         # Save to JSON file immediately after deletion
         save_agents_to_json()
@@ -1953,7 +2142,7 @@ def elevenlabs_stt():
             os.remove(temp_path)
             return jsonify({'error': 'Whisper is not available for audio transcription.'}), 500
         try:
-            result = whisper_model.transcribe(temp_path, language=None)  # auto-detect language
+            result = model_registry.get('whisper').transcribe(temp_path, language=None)  # auto-detect language
             transcript = result['text']
             detected_language = result.get('language', 'unknown')
         except Exception as e:
@@ -2160,6 +2349,16 @@ def edit_project_chat(project_id, chat_id):
 
 FEEDBACK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'feedback.json')
 
+def seed_feedback_scores():
+    """Build the chunk score table from feedback.json the first time, while it is still empty"""
+    try:
+        with open(FEEDBACK_FILE, 'r', encoding='utf-8') as f:
+            feedbacks = json.load(f)
+    except Exception:
+        return
+    if isinstance(feedbacks, list):
+        feedback_scores.seed(feedbacks)
+
 @app.route('/feedback', methods=['POST'])
 def submit_feedback():
     logger.info('POST /feedback endpoint hit (from /feedback route)')
@@ -2221,6 +2420,8 @@ def submit_feedback():
                 f.truncate()
         
         logger.info(f'Feedback saved successfully. Total feedbacks: {len(feedbacks) if 'feedbacks' in locals() else 1}')
+        # Re-ranking reads the in-memory table; it is written back to disk in the background
+        feedback_scores.record(feedback_entry['documentChunkIds'], feedback_vote(feedback_entry), feedback_entry['stars'])
         return jsonify({'success': True, 'message': 'Feedback saved successfully'}), 200
     except Exception as e:
         logger.error(f"Error saving feedback: {e}")
@@ -2450,7 +2651,16 @@ def get_monitoring_summary():
             'user_counts': user_counts,
             'agent_counts': agent_counts,
             'avg_response_time': round(avg_response_time, 2),
-            'success_rate': round(success_rate, 2)
+            'success_rate': round(success_rate, 2),
+            'agent_index_cache': agent_retrievers.stats(),
+            'shared_vector_store': shared_store.stats(),
+            'embedding_cache': embeddings.stats(),
+            'models': model_registry.stats(),
+            'response_cache': response_cache.stats(),
+            'semantic_cache': semantic_cache.stats(),
+            'feedback_scores': feedback_scores.stats(),
+            'cross_encoder': cross_encoder.stats(),
+            'adaptive_top_k': adaptive_top_k.stats()
         }
         
         return jsonify(summary)
@@ -2631,7 +2841,7 @@ def whisper_stt():
             os.remove(temp_path)
             return jsonify({'error': 'Whisper is not available for audio transcription.'}), 500
         try:
-            result = whisper_model.transcribe(temp_path, language=None)  # auto-detect language
+            result = model_registry.get('whisper').transcribe(temp_path, language=None)  # auto-detect language
             transcript = result['text']
             detected_language = result.get('language', 'unknown')
         except Exception as e:
@@ -2675,72 +2885,6 @@ def extract_meaningful_highlight(chunk, question, window=3):
             return chunk[:200]
     return highlight if highlight else chunk[:200]
 
-def load_documents_from_directory(directory_path: str) -> list[Document]:
-    """Load all supported documents from a directory and convert them to LangChain Documents"""
-    from langchain_core.documents import Document
-    import docx
-    import csv
-    import mimetypes
-    supported_docs = []
-    for filename in os.listdir(directory_path):
-        file_path = os.path.join(directory_path, filename)
-        if filename.lower().endswith('.pdf'):
-            try:
-                reader = PdfReader(file_path)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading PDF {filename}: {str(e)}")
-        elif filename.lower().endswith('.txt'):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    text = f.read()
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading TXT {filename}: {str(e)}")
-        elif filename.lower().endswith('.docx'):
-            try:
-                docx_file = docx.Document(file_path)
-                text = "\n".join([p.text for p in docx_file.paragraphs])
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading DOCX {filename}: {str(e)}")
-        elif filename.lower().endswith('.csv'):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    text = "\n".join([", ".join(row) for row in reader])
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading CSV {filename}: {str(e)}")
-        elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            try:
-                from backend.pdf_utils import convert_image_to_text
-                with open(file_path, 'rb') as imgf:
-                    image_data = imgf.read()
-                text = convert_image_to_text(image_data)
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading image {filename}: {str(e)}")
-        elif filename.lower().endswith('.mp3'):
-            try:
-                # Placeholder: add your audio transcription logic here
-                text = f"[Audio file: {filename}]"
-                doc = Document(page_content=text, metadata={"source": filename})
-                supported_docs.append(doc)
-            except Exception as e:
-                logger.error(f"Error loading audio {filename}: {str(e)}")
-        else:
-            logger.info(f"Skipping unsupported file type: {filename}")
-    return supported_docs
-
 def load_txt_as_documents(txt_filename):
     txt_dir = app.config['UPLOAD_FOLDER']
     txt_path = os.path.join(txt_dir, txt_filename)
@@ -2748,10 +2892,7 @@ def load_txt_as_documents(txt_filename):
     try:
         with open(txt_path, 'r', encoding='utf-8') as f:
             text = f.read()
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_text(text)
-        docs = [Document(page_content=chunk, metadata={"source": txt_filename, "file_type": "txt"}) for chunk in chunks]
+        docs = chunk_text(text, {"source": txt_filename, "file_type": "txt"})
         logger.info(f"Loaded {len(docs)} chunks from TXT {txt_filename}")
     except Exception as e:
         logger.warning(f"Failed to load TXT {txt_filename}: {e}")
@@ -2764,10 +2905,7 @@ def load_docx_as_documents(docx_filename):
     docs = []
     try:
         text = docx2txt.process(docx_path)
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_text(text)
-        docs = [Document(page_content=chunk, metadata={"source": docx_filename, "file_type": "docx"}) for chunk in chunks]
+        docs = chunk_text(text, {"source": docx_filename, "file_type": "docx"})
         logger.info(f"Loaded {len(docs)} chunks from DOCX {docx_filename}")
     except Exception as e:
         logger.warning(f"Failed to load DOCX {docx_filename}: {e}")
@@ -2782,12 +2920,9 @@ def load_csv_as_documents(csv_filename):
         with open(csv_path, 'r', encoding='utf-8') as f:
             reader = csv.reader(f)
             rows = list(reader)
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
         for i, row in enumerate(rows):
             row_text = ', '.join(row)
-            splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-            chunks = splitter.split_text(row_text)
-            docs.extend([Document(page_content=chunk, metadata={"source": csv_filename, "file_type": "csv", "row": i}) for chunk in chunks])
+            docs.extend(chunk_text(row_text, {"source": csv_filename, "file_type": "csv", "row": i}))
         logger.info(f"Loaded {len(docs)} chunks from CSV {csv_filename}")
     except Exception as e:
         logger.warning(f"Failed to load CSV {csv_filename}: {e}")
@@ -2802,10 +2937,7 @@ def load_image_as_documents(image_filename):
         with open(img_path, 'rb') as imgf:
             image_data = imgf.read()
         text = convert_image_to_text(image_data)
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_text(text)
-        docs = [Document(page_content=chunk, metadata={"source": image_filename, "file_type": "image"}) for chunk in chunks]
+        docs = chunk_text(text, {"source": image_filename, "file_type": "image"})
         logger.info(f"Loaded {len(docs)} chunks from image {image_filename}")
     except Exception as e:
         logger.warning(f"Failed to load image {image_filename}: {e}")
@@ -2825,37 +2957,12 @@ def load_audio_as_documents(audio_filename):
             if text:
                 with open(transcript_path, 'w', encoding='utf-8') as tf:
                     tf.write(text)
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        chunks = splitter.split_text(text)
-        docs = [Document(page_content=chunk, metadata={"source": audio_filename, "file_type": "audio"}) for chunk in chunks]
+        docs = chunk_text(text, {"source": audio_filename, "file_type": "audio"})
         logger.info(f"Loaded {len(docs)} chunks from audio {audio_filename}")
     except Exception as e:
         logger.warning(f"Failed to load audio {audio_filename}: {e}")
     return docs
 
-# Update load_documents_from_directory to use these loaders for each file type
-
-def load_documents_from_directory(directory_path: str) -> list[Document]:
-    """Load all supported documents from a directory and convert them to LangChain Documents"""
-    supported_docs = []
-    for filename in os.listdir(directory_path):
-        if filename.lower().endswith('.pdf'):
-            supported_docs.extend(load_pdf_as_documents(filename))
-        elif filename.lower().endswith('.txt'):
-            supported_docs.extend(load_txt_as_documents(filename))
-        elif filename.lower().endswith('.docx'):
-            supported_docs.extend(load_docx_as_documents(filename))
-        elif filename.lower().endswith('.csv'):
-            supported_docs.extend(load_csv_as_documents(filename))
-        elif filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            supported_docs.extend(load_image_as_documents(filename))
-        elif filename.lower().endswith('.mp3'):
-            supported_docs.extend(load_audio_as_documents(filename))
-        else:
-            logger.info(f"Skipping unsupported file type: {filename}")
-    return supported_docs
-
 # Monitoring and Analytics
 MONITORING_FILE = 'monitoring_data.json'
 
@@ -3644,5 +3751,6 @@ def get_banner_storage():
 if __name__ == '__main__':
     print("Starting Flask app...")
     load_sessions()
+    app = create_app()
     # Disable debug mode and reloader
     app.run(host='0.0.0.0', port=5000, debug=False, use_reloader=False) 
\ No newline at end of file
@@ -0,0 +1,81 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class AgentRetrieverCache:
+    """Per-agent retriever views, built on first use and kept until invalidated.
+
+    `loader(agent_id)` returns a retriever (or None). A view holds only the agent's id set; the
+    vectors and text live once in the shared store, so views are never evicted for size.
+    """
+
+    def __init__(self, loader):
+        self.loader = loader
+        self._entries = {}  # agent_id -> retriever
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self.metrics = {'hits': 0, 'misses': 0, 'loads': 0, 'load_failures': 0, 'load_seconds': 0.0}
+
+    def __contains__(self, agent_id):
+        with self._lock:
+            return agent_id in self._entries
+
+    def peek(self, agent_id):
+        """Return the built retriever for an agent without building it"""
+        with self._lock:
+            return self._entries.get(agent_id)
+
+    def get(self, agent_id, default=None):
+        """Return the agent's retriever, building it (loading missing files from snapshots) on first use"""
+        if agent_id is None:
+            return default
+        with self._lock:
+            if agent_id in self._entries:
+                self.metrics['hits'] += 1
+                return self._entries[agent_id]
+            self.metrics['misses'] += 1
+            load_lock = self._load_locks.setdefault(agent_id, threading.Lock())
+        # Load outside the cache lock so other agents stay servable; one loader per agent
+        with load_lock:
+            resident = self.peek(agent_id)
+            if resident is not None:
+                return resident
+            started = time.time()
+            try:
+                retriever = self.loader(agent_id)
+            except Exception as e:
+                logger.error(f"Error loading retriever for agent {agent_id}: {e}")
+                retriever = None
+            with self._lock:
+                self.metrics['load_seconds'] += time.time() - started
+                if retriever is None:
+                    self.metrics['load_failures'] += 1
+                    return default
+                self.metrics['loads'] += 1
+                self._entries[agent_id] = retriever
+            logger.info(f"Loaded retriever for agent {agent_id} in {time.time() - started:.2f}s")
+            return retriever
+
+    def invalidate(self, agent_id):
+        """Drop an agent's retriever; the next query rebuilds it"""
+        with self._lock:
+            self._entries.pop(agent_id, None)
+
+    def resident_bytes(self):
+        """Size of the views themselves (their id sets); the vectors are counted by the shared store"""
+        with self._lock:
+            return sum(retriever.nbytes() for retriever in self._entries.values())
+
+    def stats(self):
+        """Cache metrics for the monitoring endpoints"""
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'load_seconds': round(self.metrics['load_seconds'], 3),
+                'hit_rate': round(self.metrics['hits'] / lookups * 100, 2) if lookups else 0,
+                'resident_agents': list(self._entries.keys()),
+                'resident_bytes': self.resident_bytes()
+            }
@@ -0,0 +1,93 @@
+import os
+import logging
+import threading
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Tokenizers' own thread pool does not survive the fork into extraction workers
+os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+logger = logging.getLogger(__name__)
+
+# Token-aware chunking configuration
+CHUNKING_CONFIG = {
+    'tokenizer': os.getenv('CHUNK_TOKENIZER', 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'),
+    'cache_dir': os.getenv('HF_CACHE_DIR') or None,  # None uses the standard Hugging Face cache, outside the repo
+    'max_seq_length': int(os.getenv('EMBEDDING_MAX_SEQ_LENGTH', 128)),  # Embedder truncates past this many tokens
+    'special_tokens': 2,  # [CLS] and [SEP] count against max_seq_length
+    'chunk_overlap': int(os.getenv('CHUNK_OVERLAP_TOKENS', 16)),
+    'chars_per_token': 4,  # Fallback estimate when the tokenizer cannot be loaded
+}
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+def max_chunk_tokens():
+    """Largest chunk (in tokens, excluding special tokens) the embedder encodes without truncation"""
+    return CHUNKING_CONFIG['max_seq_length'] - CHUNKING_CONFIG['special_tokens']
+
+def get_tokenizer():
+    """Return the embedder's tokenizer, loaded on first use (None if it cannot be loaded)"""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                try:
+                    from transformers import AutoTokenizer
+                    _tokenizer = AutoTokenizer.from_pretrained(CHUNKING_CONFIG['tokenizer'], cache_dir=CHUNKING_CONFIG['cache_dir'])
+                except Exception as e:
+                    logger.warning(f"Could not load tokenizer {CHUNKING_CONFIG['tokenizer']}, estimating tokens from characters: {e}")
+                    _tokenizer = False
+    return _tokenizer or None
+
+def count_tokens(text):
+    """Number of embedder tokens in text, excluding special tokens"""
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHUNKING_CONFIG['chars_per_token'])
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+def token_unit():
+    """What count_tokens() measures in this process: 'tokens', or 'chars_estimate' without a tokenizer"""
+    return 'tokens' if get_tokenizer() is not None else 'chars_estimate'
+
+def chunker_config(loader, chunk_size=None, chunk_overlap=None, version=2):
+    """Chunker settings for a loader. They are part of each file's snapshot key, together with
+    token_unit(), which is resolved when a key is built rather than here so importing stays cheap."""
+    return {
+        'loader': loader,
+        'tokenizer': CHUNKING_CONFIG['tokenizer'],
+        'chunk_size': min(chunk_size or max_chunk_tokens(), max_chunk_tokens()),
+        'chunk_overlap': CHUNKING_CONFIG['chunk_overlap'] if chunk_overlap is None else chunk_overlap,
+        'version': version
+    }
+
+def get_splitter(chunk_size=None, chunk_overlap=None):
+    """Recursive splitter measuring length in embedder tokens, capped at the embedder's max sequence length"""
+    chunk_size = min(chunk_size or max_chunk_tokens(), max_chunk_tokens())
+    chunk_overlap = CHUNKING_CONFIG['chunk_overlap'] if chunk_overlap is None else min(chunk_overlap, chunk_size // 2)
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=count_tokens)
+
+def chunk_text(text, metadata, chunk_size=None, chunk_overlap=None):
+    """Split text into token-bounded Documents that each carry a copy of metadata"""
+    if not text or not text.strip():
+        return []
+    splitter = get_splitter(chunk_size, chunk_overlap)
+    # The token count travels with the chunk so the prompt builder never re-tokenizes it
+    return [Document(page_content=chunk, metadata=dict(metadata, token_count=count_tokens(chunk)))
+            for chunk in splitter.split_text(text) if chunk.strip()]
+
+def assign_token_counts(documents):
+    """Set metadata['token_count'] on documents chunked before counts were stored"""
+    for doc in documents:
+        if doc.metadata.get('token_count') is None:
+            doc.metadata['token_count'] = count_tokens(doc.page_content)
+    return documents
+
+def chunk_documents(documents, chunk_size=None, chunk_overlap=None):
+    """Split Documents (e.g. one per PDF page) into token-bounded chunks, keeping each one's metadata"""
+    chunks = []
+    for doc in documents:
+        chunks.extend(chunk_text(doc.page_content, doc.metadata, chunk_size, chunk_overlap))
+    return chunks
@@ -0,0 +1,139 @@
+import os
+import hashlib
+import logging
+
+from langchain_core.documents import Document
+
+from backend.chunking import count_tokens
+
+logger = logging.getLogger(__name__)
+
+def _parse_budgets(value):
+    """'gemini=6000,llama3=2500' -> {'gemini': 6000, 'llama3': 2500}"""
+    budgets = {}
+    for item in value.split(','):
+        if '=' in item:
+            name, tokens = item.split('=', 1)
+            budgets[name.strip()] = int(tokens)
+    return budgets
+
+# Prompt context assembly configuration
+CONTEXT_CONFIG = {
+    'default_budget': int(os.getenv('CONTEXT_TOKEN_BUDGET', 3000)),  # Context tokens for models without their own budget
+    'model_budgets': _parse_budgets(os.getenv('CONTEXT_TOKEN_BUDGETS', 'gemini=6000,llama3=2500,mistral=2500')),
+    'header_tokens': 12,  # Estimated cost of each block's "[Source: ..., Page: ...]" line
+    'max_overlap_chars': 1000,  # Longest chunk-to-chunk overlap looked for when merging neighbours
+    'min_overlap_chars': 8,  # Shorter suffix/prefix matches are treated as coincidence
+}
+
+def token_budget(model_name):
+    return CONTEXT_CONFIG['model_budgets'].get(model_name, CONTEXT_CONFIG['default_budget'])
+
+def doc_tokens(doc):
+    """Token count stored on the chunk at ingest, counted now only for chunks that predate it"""
+    tokens = doc.metadata.get('token_count')
+    return tokens if tokens is not None else count_tokens(doc.page_content)
+
+def doc_chunk_ids(doc):
+    """Chunk ids behind a (possibly merged) context document"""
+    if doc.metadata.get('chunk_ids'):
+        return list(doc.metadata['chunk_ids'])
+    return [doc.metadata['chunk_id']] if doc.metadata.get('chunk_id') else []
+
+def overlap_length(previous, following):
+    """Length of the longest suffix of `previous` that is also a prefix of `following` (0 if none)"""
+    tail = previous[-CONTEXT_CONFIG['max_overlap_chars']:]
+    probe = following[:CONTEXT_CONFIG['min_overlap_chars']]
+    if len(probe) < CONTEXT_CONFIG['min_overlap_chars']:
+        return 0
+    start = tail.find(probe)
+    while start != -1:
+        if following.startswith(tail[start:]):
+            return len(tail) - start
+        start = tail.find(probe, start + 1)
+    return 0
+
+class _Block:
+    """One context entry: a run of neighbouring chunks from the same page, ranked by its best member"""
+
+    def __init__(self, rank, doc):
+        self.rank = rank
+        self.first = doc
+        self.text = doc.page_content
+        self.tokens = doc_tokens(doc)
+        self.chunk_ids = doc_chunk_ids(doc)
+        self.last_index = doc.metadata.get('chunk_index')
+
+    def follows(self, doc):
+        """True if doc continues this block: the next chunk of the file, or text that overlaps its end"""
+        index = doc.metadata.get('chunk_index')
+        if index is not None and self.last_index is not None:
+            return index == self.last_index + 1
+        return overlap_length(self.text, doc.page_content) > 0
+
+    def extend(self, rank, doc):
+        overlap = overlap_length(self.text, doc.page_content)
+        if overlap:
+            self.text += doc.page_content[overlap:]
+            self.tokens += doc_tokens(doc) - count_tokens(doc.page_content[:overlap])
+        else:
+            self.text += "\n" + doc.page_content
+            self.tokens += doc_tokens(doc)
+        self.rank = min(self.rank, rank)
+        self.chunk_ids += doc_chunk_ids(doc)
+        self.last_index = doc.metadata.get('chunk_index')
+
+    def document(self):
+        if len(self.chunk_ids) <= 1:
+            return self.first
+        metadata = dict(self.first.metadata, chunk_ids=self.chunk_ids, token_count=self.tokens)
+        return Document(page_content=self.text, metadata=metadata)
+
+def build_context_documents(docs, budget_tokens):
+    """Turn ranked chunks into prompt context: drop exact duplicates, merge neighbouring or overlapping
+    chunks of the same page, then keep blocks in relevance order while they fit in budget_tokens.
+
+    Returns (documents, report). The best-ranked block is always kept.
+    """
+    seen = set()
+    unique = []
+    for rank, doc in enumerate(docs):
+        digest = hashlib.sha256(' '.join(doc.page_content.split()).encode('utf-8')).hexdigest()
+        if digest in seen:
+            continue
+        seen.add(digest)
+        unique.append((rank, doc))
+
+    # Within each (source, page), walk chunks in file order and merge runs of neighbours
+    groups = {}
+    for rank, doc in unique:
+        groups.setdefault((doc.metadata.get('source'), doc.metadata.get('page')), []).append((rank, doc))
+    blocks = []
+    for members in groups.values():
+        members.sort(key=lambda item: (item[1].metadata.get('chunk_index', item[0]), item[0]))
+        block = None
+        for rank, doc in members:
+            if block is not None and block.follows(doc):
+                block.extend(rank, doc)
+            else:
+                block = _Block(rank, doc)
+                blocks.append(block)
+    blocks.sort(key=lambda block: block.rank)
+
+    kept = []
+    used = 0
+    for block in blocks:
+        cost = block.tokens + CONTEXT_CONFIG['header_tokens']
+        if kept and used + cost > budget_tokens:
+            continue
+        kept.append(block.document())
+        used += cost
+    report = {
+        'chunks_in': len(docs),
+        'duplicates_dropped': len(docs) - len(unique),
+        'blocks': len(blocks),
+        'blocks_kept': len(kept),
+        'tokens': used,
+        'budget': budget_tokens
+    }
+    return kept, report
@@ -0,0 +1,158 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Embedding cache configuration
+EMBEDDING_CACHE_CONFIG = {
+    'db_path': os.getenv('EMBEDDING_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_cache.sqlite3')),
+    'lookup_batch_size': 500,  # Keys per SELECT ... IN (...) query
+    'query_cache_size': int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 4096)),  # Query vectors kept in memory
+}
+
+def text_cache_key(text, model_id):
+    """sha256 of the model id and chunk text; identical text under the same model shares one vector"""
+    return hashlib.sha256(f"{model_id}\x00{text}".encode('utf-8')).hexdigest()
+
+def normalize_query(text):
+    """Unicode-normalize, case-fold and collapse whitespace so trivially different spellings of a question match"""
+    return ' '.join(unicodedata.normalize('NFKC', text).casefold().split())
+
+class QueryEmbeddingCache:
+    """Bounded, thread-safe LRU of query vectors keyed by (model id, normalized query)"""
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or EMBEDDING_CACHE_CONFIG['query_cache_size']
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.metrics['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return list(vector)
+
+    def put(self, key, vector):
+        with self._lock:
+            self._entries[key] = tuple(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'hit_rate': round(self.metrics['hits'] / lookups * 100, 2) if lookups else 0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries
+            }
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that persists document vectors in sqlite, keyed by sha256(model id + text).
+
+    Only texts never seen before under this model reach the wrapped model, so rebuilds and
+    re-uploads pay for genuinely new text only.
+    """
+
+    def __init__(self, embeddings, model_id, db_path=None):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.db_path = db_path or EMBEDDING_CACHE_CONFIG['db_path']
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, model TEXT, dim INTEGER, vector BLOB)')
+        self._conn.commit()
+        self.metrics = {'hits': 0, 'misses': 0}
+        self.query_cache = QueryEmbeddingCache()
+
+    def _lookup(self, keys):
+        found = {}
+        batch_size = EMBEDDING_CACHE_CONFIG['lookup_batch_size']
+        with self._lock:
+            for i in range(0, len(keys), batch_size):
+                batch = keys[i:i+batch_size]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(f'SELECT key, vector FROM embeddings WHERE key IN ({placeholders})', batch).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype='float32').tolist()
+        return found
+
+    def _store(self, items):
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, model, dim, vector) VALUES (?, ?, ?, ?)',
+                [(key, self.model_id, len(vector), np.asarray(vector, dtype='float32').tobytes()) for key, vector in items]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts):
+        keys = [text_cache_key(text, self.model_id) for text in texts]
+        cached = self._lookup(list(set(keys)))
+        # Embed each distinct missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            computed = list(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update({key: list(vector) for key, vector in computed})
+        with self._lock:
+            self.metrics['misses'] += len(missing)
+            self.metrics['hits'] += len(texts) - len(missing)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text):
+        key = (self.model_id, normalize_query(text))
+        vector = self.query_cache.get(key)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def embed_queries(self, texts):
+        """embed_query() for many texts: cached queries are reused and the rest are encoded in one batch"""
+        keys = [(self.model_id, normalize_query(text)) for text in texts]
+        vectors = [self.query_cache.get(key) for key in keys]
+        missing = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], texts[i])
+        if missing:
+            # Sentence-transformer query embeddings are plain document embeddings (no query prefix)
+            fresh = dict(zip(missing, self.embeddings.embed_documents(list(missing.values()))))
+            for key, vector in fresh.items():
+                self.query_cache.put(key, vector)
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def stats(self):
+        """Hit/miss counters for the monitoring endpoints"""
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            stored = self._conn.execute('SELECT COUNT(*) FROM embeddings WHERE model = ?', (self.model_id,)).fetchone()[0]
+            return {
+                **self.metrics,
+                'hit_rate': round(self.metrics['hits'] / lookups * 100, 2) if lookups else 0,
+                'stored_vectors': stored,
+                'model': self.model_id,
+                'query_cache': self.query_cache.stats()
+            }
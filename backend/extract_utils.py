@@ -0,0 +1,238 @@
+import os
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pdfplumber
+import pytesseract
+import cv2
+import docx2txt
+from PIL import Image
+from pypdf import PdfReader
+
+from backend.chunking import chunk_text, get_tokenizer
+
+pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+logger = logging.getLogger(__name__)
+
+# Extraction worker pool configuration
+EXTRACTION_CONFIG = {
+    'workers': int(os.getenv('EXTRACTION_WORKERS', os.cpu_count() or 1)),
+    'pages_per_task': int(os.getenv('EXTRACTION_PAGES_PER_TASK', 25)),  # PDF page range handed to one worker
+}
+
+STRUCTURED_EXTENSIONS = ['csv', 'xlsx', 'json']
+IMAGE_EXTENSIONS = ['jpg', 'jpeg', 'png', 'bmp', 'webp', 'tiff']
+AUDIO_EXTENSIONS = ['mp3', 'wav', 'ogg', 'm4a']
+
+def extract_structured(file_path):
+    ext = file_path.lower().split('.')[-1]
+    try:
+        if ext == 'csv':
+            df = pd.read_csv(file_path)
+        elif ext == 'xlsx':
+            df = pd.read_excel(file_path)
+        elif ext == 'json':
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                df = pd.json_normalize(data)
+            else:
+                df = pd.json_normalize([data])
+        else:
+            raise ValueError('Unsupported structured file')
+        if df.empty:
+            logger.warning(f"Structured file {file_path} is empty.")
+            return []
+        return df.to_dict(orient='records')
+    except Exception as e:
+        logger.error(f"Failed to extract structured data from {file_path}: {e}")
+        return []
+
+def extract_text(file_path):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def extract_pdf(file_path):
+    extracted_text = []
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text() or ''
+            if text.strip():
+                extracted_text.append(text)
+            else:
+                # Fallback: Convert page to image and run Tesseract OCR
+                pil_img = page.to_image(resolution=300).original
+                img_gray = pil_img.convert('L')
+                img_np = np.array(img_gray)
+                img_bin = cv2.adaptiveThreshold(img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+                img_pil = Image.fromarray(img_bin)
+                ocr_text = pytesseract.image_to_string(img_pil)
+                extracted_text.append(ocr_text)
+    return '\n'.join(extracted_text)
+
+def preprocess_image_for_ocr(image):
+    img_gray = image.convert('L')
+    img_np = np.array(img_gray)
+    img_bin = cv2.adaptiveThreshold(img_np, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 2)
+    img_pil = Image.fromarray(img_bin)
+    if img_pil.width < 600:
+        scale = 600 / img_pil.width
+        new_size = (int(img_pil.width * scale), int(img_pil.height * scale))
+        img_pil = img_pil.resize(new_size, Image.ANTIALIAS)
+    return img_pil
+
+def extract_image(file_path, use_trocr=False):
+    try:
+        try:
+            image = Image.open(file_path).convert('RGB')
+            logger.info(f"Loaded image {file_path} with Pillow.")
+        except Exception as pil_e:
+            logger.warning(f"Pillow failed to open {file_path}: {pil_e}. Trying OpenCV...")
+            img_cv = cv2.imread(file_path)
+            if img_cv is None:
+                logger.error(f"OpenCV failed to open {file_path} as image.")
+                return ''
+            image = Image.fromarray(cv2.cvtColor(img_cv, cv2.COLOR_BGR2RGB))
+            logger.info(f"Loaded image {file_path} with OpenCV.")
+        preprocessed = preprocess_image_for_ocr(image)
+        if not use_trocr:
+            try:
+                text = pytesseract.image_to_string(preprocessed)
+                logger.info(f"Extracted text from image {file_path} using Tesseract, length: {len(text)} chars.")
+                return text
+            except Exception as tess_e:
+                logger.error(f"Tesseract OCR failed for {file_path}: {tess_e}")
+                return ''
+        else:
+            # Add TrOCR logic here if needed
+            return ''
+    except Exception as e:
+        logger.error(f"Failed to extract text from image {file_path}: {e}")
+        return ''
+
+def count_pdf_pages(file_path):
+    """Return the number of pages in a PDF"""
+    return len(PdfReader(file_path).pages)
+
+def load_pdf_page_range(file_path, start=0, end=None, chunk_size=None, chunk_overlap=None):
+    """Read pages [start, end) of a PDF into token-bounded chunks, each tagged with its page number"""
+    filename = os.path.basename(file_path)
+    reader = PdfReader(file_path)
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    docs = []
+    for i in range(start, end):
+        text = reader.pages[i].extract_text()
+        if text:
+            docs.extend(chunk_text(text, {"source": filename, "page": i+1}, chunk_size, chunk_overlap))
+    return docs
+
+def load_file_documents(file_path, chunk_size=None, chunk_overlap=None):
+    """Extract and chunk a single non-audio source file into LangChain Documents.
+
+    chunk_size and chunk_overlap are in embedder tokens (see backend.chunking).
+    """
+    filename = os.path.basename(file_path)
+    ext = filename.lower().split('.')[-1]
+    if ext == 'pdf':
+        return load_pdf_page_range(file_path, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    elif ext in STRUCTURED_EXTENSIONS:
+        content = extract_structured(file_path)
+        if not content:
+            logger.warning(f"No structured data extracted from {filename} (type: {ext})")
+            return []
+        logger.info(f"Extracted structured data from {filename}, {len(content)} rows.")
+        docs = []
+        for i, row in enumerate(content):
+            # Short rows stay whole; long ones are split at the token limit
+            row_text = json.dumps(row, ensure_ascii=False)
+            docs.extend(chunk_text(row_text, {"source": filename, "file_type": ext, "row": i}, chunk_size, chunk_overlap))
+        logger.info(f"Created {len(docs)} document chunks for {filename}")
+        return docs
+    elif ext in IMAGE_EXTENSIONS:
+        content = extract_image(file_path, use_trocr=False)
+        if not content:
+            logger.warning(f"No text extracted from image {filename} (type: {ext})")
+            return []
+        logger.info(f"Extracted text from image {filename}, length: {len(content)} chars.")
+    elif ext == 'txt':
+        content = extract_text(file_path)
+        if not content:
+            logger.warning(f"No text extracted from {filename} (type: {ext})")
+            return []
+        logger.info(f"Extracted text from {filename}, length: {len(content)} chars.")
+    elif ext == 'docx':
+        content = docx2txt.process(file_path)
+    else:
+        logger.warning(f"Unsupported file type for retriever: {filename} (type: {ext})")
+        return []
+    docs = chunk_text(content, {"source": filename, "file_type": ext}, chunk_size, chunk_overlap)
+    logger.info(f"Created {len(docs)} document chunks for {filename}")
+    return docs
+
+def _extraction_tasks(file_path, chunk_size, chunk_overlap):
+    """Split one file into independent (function, args) tasks; PDFs fan out by page range"""
+    if file_path.lower().endswith('.pdf'):
+        try:
+            page_count = count_pdf_pages(file_path)
+        except Exception as e:
+            logger.error(f"Error reading page count of {file_path}: {e}")
+            return []
+        step = max(1, EXTRACTION_CONFIG['pages_per_task'])
+        return [(load_pdf_page_range, (file_path, start, start + step, chunk_size, chunk_overlap)) for start in range(0, page_count, step)]
+    return [(load_file_documents, (file_path, chunk_size, chunk_overlap))]
+
+def _run_task(task):
+    func, args = task
+    try:
+        return func(*args)
+    except Exception as e:
+        logger.error(f"Extraction task {func.__name__}{args} failed: {e}")
+        return []
+
+def _init_worker():
+    # Each worker loads the tokenizer once, before its first task
+    get_tokenizer()
+
+def _pool_context():
+    # The Flask process runs threads (request handlers, background loaders), so workers are never
+    # forked from it. forkserver forks them from a server that preloads only this module (and so
+    # the extraction libraries), not the app module, whose import starts threads of its own.
+    # Platforms without it (Windows) use spawn.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+def extract_files_parallel(file_paths, chunk_size=None, chunk_overlap=None, workers=None):
+    """Extract many files on a process pool, fanning PDFs out by page range.
+
+    Returns {file_path: [Document, ...]} with each file's documents in page/chunk order,
+    regardless of which worker finished first. Audio files are not handled here.
+    """
+    workers = workers or EXTRACTION_CONFIG['workers']
+    tasks = []
+    owners = []
+    for file_path in file_paths:
+        for task in _extraction_tasks(file_path, chunk_size, chunk_overlap):
+            tasks.append(task)
+            owners.append(file_path)
+    results = {file_path: [] for file_path in file_paths}
+    if not tasks:
+        return results
+    if workers <= 1 or len(tasks) == 1:
+        outputs = [_run_task(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=_pool_context(),
+                                 initializer=_init_worker) as pool:
+            # map() yields in submission order, which makes the merge deterministic
+            outputs = list(pool.map(_run_task, tasks))
+    for file_path, docs in zip(owners, outputs):
+        results[file_path].extend(docs)
+    logger.info(f"Extracted {len(file_paths)} files as {len(tasks)} tasks on {min(workers, len(tasks))} worker(s)")
+    return results
@@ -0,0 +1,58 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Federated (multi-agent) search configuration
+FEDERATED_CONFIG = {
+    'threads': int(os.getenv('FEDERATED_SEARCH_THREADS', 8)),  # Agent indexes searched at once; FAISS releases the GIL while searching
+    'max_indexes': int(os.getenv('FEDERATED_MAX_AGENTS', 8)),  # Agents one request may span
+}
+
+# Separate from the hybrid-search pool: each federated task may itself submit dense/sparse legs there
+_federated_pool = ThreadPoolExecutor(max_workers=FEDERATED_CONFIG['threads'], thread_name_prefix='federated-search')
+
+def normalize_scores(results):
+    """Min-max scale one index's [(Document, score)] (higher is better) to [0, 1]; equal scores all become 1.0"""
+    if not results:
+        return []
+    scores = [score for _, score in results]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return [(doc, (score - low) / span if span else 1.0) for doc, score in results]
+
+def federated_search(retrievers, query, k):
+    """Search several retriever views concurrently and merge them by normalized score.
+
+    `retrievers` maps a name (agent id) to a view with search_with_scores(query, k). Each view's
+    scores are min-max normalized so that RRF (hybrid) and distance (dense) views are comparable;
+    a chunk found by several views keeps its best score. Returns (merged, timings) where merged is
+    [(Document, normalized score, name)] and timings maps each name to its latency and hit count.
+    """
+    def run(name, retriever):
+        started = time.time()
+        try:
+            return name, retriever.search_with_scores(query, k), time.time() - started, None
+        except Exception as e:
+            return name, [], time.time() - started, e
+
+    started = time.time()
+    futures = [_federated_pool.submit(run, name, retriever) for name, retriever in retrievers.items()]
+    best = {}
+    timings = {}
+    for future in futures:
+        name, results, seconds, error = future.result()
+        timings[name] = {'ms': round(seconds * 1000, 2), 'results': len(results)}
+        if error is not None:
+            logger.error(f"Federated search of {name} failed: {error}")
+            timings[name]['error'] = str(error)
+        for doc, score in normalize_scores(results):
+            key = doc.metadata.get('chunk_id') or id(doc)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score, name)
+    merged = sorted(best.values(), key=lambda item: item[1], reverse=True)[:k]
+    logger.info(f"Federated search over {list(retrievers)} merged {len(best)} chunks in "
+                f"{(time.time() - started) * 1000:.1f}ms: {timings}")
+    return merged, timings
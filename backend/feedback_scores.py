@@ -0,0 +1,202 @@
+import os
+import time
+import atexit
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Per-chunk feedback score configuration
+FEEDBACK_SCORES_CONFIG = {
+    'path': os.getenv('CHUNK_FEEDBACK_SCORES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chunk_feedback_scores.sqlite3')),
+    'flush_interval_seconds': float(os.getenv('FEEDBACK_FLUSH_SECONDS', 5)),  # New votes are written at most this often
+    'refresh_interval_seconds': float(os.getenv('FEEDBACK_REFRESH_SECONDS', 30)),  # Votes from other worker processes are read back this often
+    'neutral_stars': 3,  # Star ratings are centered here, so 3 stars neither helps nor hurts
+}
+
+def feedback_vote(entry):
+    """+1 / -1 / 0 for a feedback entry, from its feedbackType or (failing that) its 1-5 rating"""
+    feedback_type = entry.get('feedbackType')
+    if feedback_type == 'positive':
+        return 1
+    if feedback_type == 'negative':
+        return -1
+    rating = entry.get('rating')
+    if isinstance(rating, (int, float)):
+        return 1 if rating >= 4 else -1 if rating <= 2 else 0
+    return 0
+
+def _empty_stats():
+    return {'net': 0, 'votes': 0, 'stars_total': 0, 'stars_count': 0, 'avg_stars': None}
+
+def _apply(stats, net, votes, stars_total, stars_count):
+    stats['net'] += net
+    stats['votes'] += votes
+    stats['stars_total'] += stars_total
+    stats['stars_count'] += stars_count
+    stats['avg_stars'] = round(stats['stars_total'] / stats['stars_count'], 3) if stats['stars_count'] else None
+
+class FeedbackScores:
+    """In-memory table of per-chunk feedback (net votes, average stars) used to re-rank retrieved chunks.
+
+    The table lives in a sqlite file shared by every worker process. `record` updates the
+    in-memory copy and queues the vote as a delta; a background thread adds queued deltas to the
+    file with upserts (so workers never overwrite each other's votes) and reads the merged table
+    back, so the query path never touches the file.
+    """
+
+    def __init__(self, path=None, flush_interval_seconds=None):
+        self.path = path or FEEDBACK_SCORES_CONFIG['path']
+        self.flush_interval = flush_interval_seconds or FEEDBACK_SCORES_CONFIG['flush_interval_seconds']
+        self._scores = {}  # chunk_id -> {'net', 'votes', 'stars_total', 'stars_count', 'avg_stars'}
+        self._pending = {}  # chunk_id -> votes recorded here but not yet written
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._writer = None
+        self.metrics = {'recorded': 0, 'flushes': 0, 'reranks': 0}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS chunk_scores (chunk_id TEXT PRIMARY KEY, net INTEGER, votes INTEGER, '
+                           'stars_total REAL, stars_count INTEGER)')
+        self._conn.commit()
+        self._refresh()
+
+    def _refresh(self):
+        """Replace the in-memory table with the file's, plus this process's unwritten votes"""
+        try:
+            with self._db_lock:
+                rows = self._conn.execute('SELECT chunk_id, net, votes, stars_total, stars_count FROM chunk_scores').fetchall()
+        except Exception as e:
+            logger.error(f"Error reading chunk feedback scores from {self.path}: {e}")
+            return
+        scores = {}
+        for chunk_id, net, votes, stars_total, stars_count in rows:
+            _apply(scores.setdefault(chunk_id, _empty_stats()), net, votes, stars_total, stars_count)
+        with self._lock:
+            for chunk_id, delta in self._pending.items():
+                _apply(scores.setdefault(chunk_id, _empty_stats()), **delta)
+            self._scores = scores
+
+    def seed(self, feedback_entries):
+        """Fill the table from stored feedback entries when it is empty in every process (done at most once)"""
+        deltas = {}
+        for entry in feedback_entries:
+            self._accumulate(deltas, entry.get('documentChunkIds'), feedback_vote(entry), entry.get('stars'))
+        if deltas:
+            with self._db_lock:
+                # BEGIN IMMEDIATE holds the write lock across the check, so concurrent workers seed once
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if self._conn.execute('SELECT COUNT(*) FROM chunk_scores').fetchone()[0] == 0:
+                        self._upsert(deltas)
+                    self._conn.commit()
+                except Exception:
+                    self._conn.rollback()
+                    raise
+            self._refresh()
+        self._start_writer()
+
+    @staticmethod
+    def _accumulate(deltas, chunk_ids, vote, stars):
+        stars = stars if isinstance(stars, (int, float)) and 1 <= stars <= 5 else None
+        for chunk_id in chunk_ids or []:
+            delta = deltas.setdefault(chunk_id, {'net': 0, 'votes': 0, 'stars_total': 0, 'stars_count': 0})
+            delta['net'] += vote
+            delta['votes'] += 1 if vote else 0
+            if stars is not None:
+                delta['stars_total'] += stars
+                delta['stars_count'] += 1
+
+    def record(self, chunk_ids, vote, stars=None):
+        """Add one vote (+1/-1/0) and an optional 1-5 star rating to every chunk an answer cited"""
+        if not chunk_ids:
+            return
+        deltas = {}
+        self._accumulate(deltas, chunk_ids, vote, stars)
+        with self._lock:
+            for chunk_id, delta in deltas.items():
+                _apply(self._scores.setdefault(chunk_id, _empty_stats()), **delta)
+                pending = self._pending.setdefault(chunk_id, {'net': 0, 'votes': 0, 'stars_total': 0, 'stars_count': 0})
+                for field, value in delta.items():
+                    pending[field] += value
+            self.metrics['recorded'] += 1
+        self._dirty.set()
+        self._start_writer()
+
+    def score(self, chunk_id):
+        """Net votes plus the average star rating's distance from neutral; 0 for chunks without feedback"""
+        stats = self._scores.get(chunk_id)
+        if stats is None:
+            return 0
+        score = stats['net']
+        if stats['avg_stars']:
+            score += stats['avg_stars'] - FEEDBACK_SCORES_CONFIG['neutral_stars']
+        return score
+
+    def rerank(self, docs):
+        """Order docs by feedback score, keeping retrieval order among equal scores (returned unchanged without feedback)"""
+        if not self._scores or not docs:
+            return docs
+        scores = [self.score(doc.metadata.get('chunk_id') or doc.metadata.get('id')) for doc in docs]
+        if not any(scores):
+            return docs
+        self.metrics['reranks'] += 1
+        order = sorted(range(len(docs)), key=lambda i: -scores[i])
+        return [docs[i] for i in order]
+
+    def _start_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='feedback-scores-writer', daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            # Wake for new votes, or periodically to pick up other workers' votes
+            self._dirty.wait(FEEDBACK_SCORES_CONFIG['refresh_interval_seconds'])
+            self.flush()
+            self._refresh()
+            time.sleep(self.flush_interval)
+
+    def _upsert(self, deltas):
+        self._conn.executemany(
+            'INSERT INTO chunk_scores (chunk_id, net, votes, stars_total, stars_count) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(chunk_id) DO UPDATE SET net = net + excluded.net, votes = votes + excluded.votes, '
+            'stars_total = stars_total + excluded.stars_total, stars_count = stars_count + excluded.stars_count',
+            [(chunk_id, d['net'], d['votes'], d['stars_total'], d['stars_count']) for chunk_id, d in deltas.items()]
+        )
+
+    def flush(self):
+        """Add this process's unwritten votes to the shared file now"""
+        if not self._dirty.is_set():
+            return
+        self._dirty.clear()
+        with self._lock:
+            deltas, self._pending = self._pending, {}
+        if not deltas:
+            return
+        try:
+            with self._db_lock:
+                self._upsert(deltas)
+                self._conn.commit()
+            self.metrics['flushes'] += 1
+        except Exception as e:
+            logger.error(f"Error writing chunk feedback scores to {self.path}: {e}")
+            with self._lock:
+                # Put the votes back in front of anything recorded since
+                for chunk_id, delta in deltas.items():
+                    pending = self._pending.setdefault(chunk_id, {'net': 0, 'votes': 0, 'stars_total': 0, 'stars_count': 0})
+                    for field, value in delta.items():
+                        pending[field] += value
+            self._dirty.set()
+
+    def stats(self):
+        with self._lock:
+            return {**self.metrics, 'chunks': len(self._scores), 'pending_write': len(self._pending)}
+
+# Shared by the Flask chat path and RAGPipeline
+feedback_scores = FeedbackScores()
+atexit.register(feedback_scores.flush)
@@ -0,0 +1,363 @@
+import os
+import re
+import math
+import time
+import atexit
+import logging
+import tempfile
+
+import numpy as np
+import faiss
+
+from backend.utils import add_vectors_in_batches
+
+logger = logging.getLogger(__name__)
+
+# Vector index configuration
+INDEX_CONFIG = {
+    'type': os.getenv('FAISS_INDEX_TYPE', 'auto').lower(),  # auto | flat | hnsw | ivf
+    'auto_hnsw_min_vectors': int(os.getenv('FAISS_AUTO_HNSW_MIN', 50000)),  # auto: exact search below this size
+    'auto_ivf_min_vectors': int(os.getenv('FAISS_AUTO_IVF_MIN', 500000)),  # auto: IVF from this size up
+    'hnsw_m': int(os.getenv('FAISS_HNSW_M', 32)),
+    'hnsw_ef_construction': int(os.getenv('FAISS_HNSW_EF_CONSTRUCTION', 80)),
+    'hnsw_ef_search': int(os.getenv('FAISS_HNSW_EF_SEARCH', 64)),
+    'ivf_nlist': int(os.getenv('FAISS_IVF_NLIST', 0)),  # 0 picks ~4*sqrt(n)
+    'ivf_nprobe': int(os.getenv('FAISS_IVF_NPROBE', 16)),
+    'eval_queries': int(os.getenv('FAISS_EVAL_QUERIES', 200)),  # Stored vectors reused as queries to measure recall at build
+    'eval_k': 10,
+    'quantization': os.getenv('FAISS_QUANTIZATION', 'none').lower(),  # none | sq8 | pq
+    'pq_m': int(os.getenv('FAISS_PQ_M', 0)),  # PQ sub-quantizers; 0 picks dim / 8 (one byte per 8 dims)
+    'rerank_factor': int(os.getenv('FAISS_RERANK_FACTOR', 4)),  # Quantized search fetches k * this, re-ranked at full precision
+    'full_precision_dir': os.getenv('FAISS_FULL_PRECISION_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faiss_snapshots')),
+    'persist': os.getenv('FAISS_PERSIST_INDEX', 'true').lower() == 'true',  # Save the built index for other processes / restarts
+    'persist_dir': os.getenv('FAISS_INDEX_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faiss_snapshots', 'shared_index')),
+    'keep_generations': max(2, int(os.getenv('FAISS_KEEP_GENERATIONS', 3))),  # Persisted generations kept on disk for processes still reading older ones
+    'mmap': os.getenv('FAISS_MMAP', 'true').lower() == 'true',  # Open the persisted index read-only and memory-mapped
+    'warm_pages': os.getenv('FAISS_MMAP_WARM_UP', 'false').lower() == 'true',  # Read the file once after mapping to fault pages in
+    'warm_block_size': 4 * 1024 * 1024,
+}
+
+def choose_index_spec(n_vectors, requested=None, quantization=None):
+    """Pick the index type (and vector compression) for a corpus of n_vectors: the configured type, or by size when 'auto'"""
+    spec = _index_type_spec(n_vectors, (requested or INDEX_CONFIG['type']).lower())
+    quantization = (quantization or INDEX_CONFIG['quantization']).lower()
+    if quantization == 'pq' and n_vectors < 256:
+        # Training 256 centroids per sub-quantizer needs at least that many vectors
+        logger.warning(f"Only {n_vectors} vectors; using SQ8 instead of PQ")
+        quantization = 'sq8'
+    spec['quantization'] = quantization if quantization in ('sq8', 'pq') else 'none'
+    if spec['quantization'] == 'pq':
+        spec['pq_m'] = INDEX_CONFIG['pq_m']
+    return spec
+
+def is_quantized(spec):
+    return spec.get('quantization', 'none') != 'none'
+
+def _index_type_spec(n_vectors, index_type):
+    if index_type == 'auto':
+        if n_vectors >= INDEX_CONFIG['auto_ivf_min_vectors']:
+            index_type = 'ivf'
+        elif n_vectors >= INDEX_CONFIG['auto_hnsw_min_vectors']:
+            index_type = 'hnsw'
+        else:
+            index_type = 'flat'
+    if index_type == 'hnsw':
+        return {'type': 'hnsw', 'm': INDEX_CONFIG['hnsw_m'], 'ef_construction': INDEX_CONFIG['hnsw_ef_construction'],
+                'ef_search': INDEX_CONFIG['hnsw_ef_search']}
+    if index_type == 'ivf':
+        nlist = INDEX_CONFIG['ivf_nlist'] or max(1, int(4 * math.sqrt(max(n_vectors, 1))))
+        # k-means needs a few dozen points per centroid to train well
+        nlist = max(1, min(nlist, n_vectors // 39 or 1))
+        return {'type': 'ivf', 'nlist': nlist, 'nprobe': min(INDEX_CONFIG['ivf_nprobe'], nlist)}
+    return {'type': 'flat'}
+
+def supports_remove(spec):
+    """HNSW graphs cannot delete vectors; the store tombstones them instead"""
+    return spec['type'] != 'hnsw'
+
+def needs_training(spec):
+    """IVF and quantized indexes must be trained on data before vectors can be added"""
+    return spec['type'] == 'ivf' or is_quantized(spec)
+
+def _pq_m(spec, dim):
+    m = spec.get('pq_m') or max(1, dim // 8)
+    if dim % m:
+        raise ValueError(f"PQ needs the dimension ({dim}) to be a multiple of pq_m ({m})")
+    return m
+
+def _make_index(spec, dim):
+    quantization = spec.get('quantization', 'none')
+    if spec['type'] == 'ivf':
+        quantizer = faiss.IndexFlatL2(dim)
+        if quantization == 'sq8':
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, spec['nlist'], faiss.ScalarQuantizer.QT_8bit)
+        elif quantization == 'pq':
+            index = faiss.IndexIVFPQ(quantizer, dim, spec['nlist'], _pq_m(spec, dim), 8)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, spec['nlist'])
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.nprobe = spec['nprobe']
+        return index
+    if spec['type'] == 'hnsw':
+        if quantization == 'sq8':
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, spec['m'])
+        elif quantization == 'pq':
+            index = faiss.IndexHNSWPQ(dim, _pq_m(spec, dim), spec['m'])
+        else:
+            index = faiss.IndexHNSWFlat(dim, spec['m'])
+        index.hnsw.efConstruction = spec['ef_construction']
+        index.hnsw.efSearch = spec['ef_search']
+        return faiss.IndexIDMap2(index)
+    if quantization == 'sq8':
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit))
+    if quantization == 'pq':
+        return faiss.IndexIDMap2(faiss.IndexPQ(dim, _pq_m(spec, dim), 8))
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dim))
+
+def empty_index(spec, dim):
+    """An empty index for specs that need no training (plain flat or HNSW)"""
+    if needs_training(spec):
+        raise ValueError(f"{spec} must be trained; use build_index()")
+    return _make_index(spec, dim)
+
+def build_index(spec, vectors, ids):
+    """Build (training first where needed) an index over vectors with external int64 ids.
+
+    Every returned index supports add_with_ids; flat and IVF also support remove_ids.
+    IVF keeps ids natively (no IDMap wrapper) with a hashtable direct map so removal and
+    reconstruction by id both work.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    ids = np.ascontiguousarray(ids, dtype='int64')
+    started = time.time()
+    index = _make_index(spec, vectors.shape[1])
+    if not index.is_trained:
+        index.train(vectors)
+    add_vectors_in_batches(index, vectors, ids)
+    logger.info(f"Built {spec['type']}/{spec.get('quantization', 'none')} index over {len(ids)} vectors in {time.time() - started:.2f}s")
+    return index
+
+def search_parameters(spec, selector=None, overrides=None):
+    """Per-search parameters (ID selector plus efSearch / nprobe, optionally overridden per agent)"""
+    overrides = overrides or {}
+    if spec['type'] == 'hnsw':
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = int(overrides.get('efSearch', spec['ef_search']))
+    elif spec['type'] == 'ivf':
+        params = faiss.SearchParametersIVF()
+        params.nprobe = int(overrides.get('nprobe', spec['nprobe']))
+    else:
+        if selector is None:
+            return None
+        params = faiss.SearchParameters()
+    if selector is not None:
+        params.sel = selector
+    return params
+
+def index_bytes_per_vector(index):
+    """Measured size of the written index divided by its vector count"""
+    if index is None or index.ntotal == 0:
+        return 0
+    # Written to a temp file rather than serialize_index() so a large index is not copied in RAM
+    with tempfile.NamedTemporaryFile(suffix='.faiss') as f:
+        faiss.write_index(index, f.name)
+        return round(os.path.getsize(f.name) / index.ntotal, 1)
+
+# Private full-precision files still owned by this process; removed at exit if never closed
+_open_private_files = set()
+
+@atexit.register
+def _close_private_files():
+    for full in list(_open_private_files):
+        full.close()
+
+_PRIVATE_FILE_PATTERN = re.compile(r'^full_precision-(\d+)-\d+\.f32$')
+
+def sweep_stale_full_precision(folder=None):
+    """Remove private full-precision files left by processes that no longer exist. Returns the count removed."""
+    folder = folder or INDEX_CONFIG['full_precision_dir']
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return 0
+    removed = 0
+    for name in names:
+        match = _PRIVATE_FILE_PATTERN.match(name)
+        if not match or int(match.group(1)) == os.getpid():
+            continue
+        try:
+            os.kill(int(match.group(1)), 0)
+            continue  # Still running
+        except ProcessLookupError:
+            pass
+        except OSError:
+            continue  # Exists but belongs to another user
+        try:
+            os.remove(os.path.join(folder, name))
+            removed += 1
+        except OSError:
+            pass
+    if removed:
+        logger.info(f"Removed {removed} full-precision files left by exited processes")
+    return removed
+
+class FullPrecisionVectors:
+    """Append-only float32 copies of the vectors on disk, read through a memory map.
+
+    A quantized index keeps only compressed codes in RAM; this file lets the final top-k be
+    re-ranked with exact distances. Rows of removed ids stay in the file until the next rebuild.
+    """
+
+    def __init__(self, dim, path=None, ids=None):
+        """A new private file, or (with `ids`) an existing persisted file shared read-only with other processes"""
+        self.dim = dim
+        self._shared = ids is not None
+        if self._shared:
+            self.path = path
+            self.rows = {int(vector_id): row for row, vector_id in enumerate(np.asarray(ids).tolist())}
+            self._count = len(self.rows)
+            # Mapped now, so the rows stay readable after a newer generation replaces this file
+            self._map = np.memmap(self.path, dtype='float32', mode='r', shape=(self._count, self.dim)) if self._count else None
+        else:
+            self.path = path or self._private_path()
+            open(self.path, 'wb').close()
+            self.rows = {}  # id -> row in the file
+            self._count = 0
+            self._map = None
+            _open_private_files.add(self)
+
+    @staticmethod
+    def _private_path():
+        folder = INDEX_CONFIG['full_precision_dir']
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f"full_precision-{os.getpid()}-{time.time_ns()}.f32")
+
+    def append(self, ids, vectors):
+        if self._shared:
+            # Never write into a file other processes have mapped; continue in a private copy
+            private = self._private_path()
+            if self._map is not None:
+                np.asarray(self._map).tofile(private)
+            else:
+                open(private, 'wb').close()
+            self.path, self._shared, self._map = private, False, None
+            _open_private_files.add(self)
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        with open(self.path, 'ab') as f:
+            f.write(vectors.tobytes())
+        for offset, vector_id in enumerate(np.asarray(ids).tolist()):
+            self.rows[vector_id] = self._count + offset
+        self._count += len(vectors)
+        self._map = None
+
+    def discard(self, ids):
+        for vector_id in np.asarray(ids).tolist():
+            self.rows.pop(vector_id, None)
+
+    def get(self, ids):
+        if not self._count or not len(ids):
+            return np.empty((0, self.dim), dtype='float32')
+        if self._map is None:
+            self._map = np.memmap(self.path, dtype='float32', mode='r', shape=(self._count, self.dim))
+        return np.asarray(self._map[[self.rows[int(vector_id)] for vector_id in ids]])
+
+    def nbytes_on_disk(self):
+        return self._count * self.dim * 4
+
+    def close(self):
+        self._map = None
+        if self._shared:
+            return
+        _open_private_files.discard(self)
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def mapped_layout(spec):
+    """How much of an index of this spec FAISS can memory-map from its file.
+
+    'full' for IVF (inverted lists) and flat indexes (flat codes, which need IO_FLAG_MMAP_IFC);
+    'codes' for HNSW, whose vector codes map but whose graph is always read into private memory;
+    'none' when this FAISS build cannot map the layout at all.
+    """
+    can_map_codes = hasattr(faiss, 'IO_FLAG_MMAP_IFC')
+    if spec['type'] == 'ivf':
+        return 'full'
+    if not can_map_codes:
+        return 'none'
+    return 'codes' if spec['type'] == 'hnsw' else 'full'
+
+def read_index_file(path, spec, mmap=None):
+    """Read a written index; with mmap, read-only and memory-mapped so processes share one page-cache copy.
+
+    Returns (index, mapped) where mapped is the mapped_layout() actually used ('none' when the
+    index was read into private memory, in which case it is also writable).
+    """
+    mmap = INDEX_CONFIG['mmap'] if mmap is None else mmap
+    mapped = mapped_layout(spec) if mmap else 'none'
+    if mapped == 'none':
+        return faiss.read_index(path), mapped
+    flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0)
+    return faiss.read_index(path, flags), mapped
+
+def warm_pages(path):
+    """Read a file once, sequentially, so its pages are in the page cache before the first query. Returns seconds."""
+    started = time.time()
+    with open(path, 'rb') as f:
+        while f.read(INDEX_CONFIG['warm_block_size']):
+            pass
+    return time.time() - started
+
+def rerank_exact(query, candidate_ids, full_vectors, k):
+    """Re-score candidate ids with exact L2 distances from full-precision vectors; returns [(id, distance)]"""
+    if not len(candidate_ids):
+        return []
+    vectors = full_vectors.get(candidate_ids)
+    distances = ((vectors - query.reshape(1, -1)) ** 2).sum(axis=1)
+    order = np.argsort(distances)[:k]
+    return [(int(candidate_ids[i]), float(distances[i])) for i in order]
+
+def reconstruct_ids(index, ids):
+    """Return the stored vectors for external ids, in order"""
+    ids = np.ascontiguousarray(ids, dtype='int64')
+    if hasattr(index, 'reconstruct_batch'):
+        try:
+            return np.asarray(index.reconstruct_batch(ids), dtype='float32')
+        except Exception:
+            pass
+    return np.vstack([index.reconstruct(int(i)) for i in ids]).astype('float32')
+
+def evaluate_index(index, vectors, ids, spec, k=None, n_queries=None):
+    """Recall@k of `index` against exact search, plus per-query latency of both, using stored vectors as queries"""
+    k = k or INDEX_CONFIG['eval_k']
+    n_queries = min(n_queries or INDEX_CONFIG['eval_queries'], len(vectors))
+    if not n_queries:
+        return {}
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), n_queries, replace=False)]
+    k = min(k, len(vectors))
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    started = time.time()
+    _, exact_labels = exact.search(queries, k)
+    exact_ms = (time.time() - started) * 1000 / n_queries
+
+    started = time.time()
+    _, labels = index.search(queries, k, params=search_parameters(spec))
+    index_ms = (time.time() - started) * 1000 / n_queries
+
+    # The exact index numbers vectors by position; translate to the external ids the index returns
+    ids = np.asarray(ids, dtype='int64')
+    hits = 0
+    for row, exact_row in zip(labels, exact_labels):
+        hits += len(set(row.tolist()) & set(ids[exact_row].tolist()))
+    return {
+        'recall_at_k': round(hits / (n_queries * k), 4),
+        'k': k,
+        'queries': n_queries,
+        'index_ms_per_query': round(index_ms, 3),
+        'exact_ms_per_query': round(exact_ms, 3)
+    }
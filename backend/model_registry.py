@@ -0,0 +1,174 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Model registry configuration
+MODEL_REGISTRY_CONFIG = {
+    'idle_check_seconds': int(os.getenv('MODEL_IDLE_CHECK_SECONDS', 60)),  # How often the reaper looks for idle models
+    'whisper_idle_seconds': int(os.getenv('WHISPER_IDLE_SECONDS', 900)),  # Unload Whisper after this long unused; 0 keeps it
+    'warm_up': [name.strip() for name in os.getenv('MODEL_WARM_UP', 'sentence_transformer').split(',') if name.strip()],  # Loaded in the background at startup
+}
+
+def estimate_model_bytes(model):
+    """Approximate resident size of a model from its torch parameters and buffers (None if unknown)"""
+    # LangChain's HuggingFaceEmbeddings keeps the SentenceTransformer on `.client`
+    target = getattr(model, 'client', model)
+    if not hasattr(target, 'parameters'):
+        return None
+    try:
+        total = sum(p.numel() * p.element_size() for p in target.parameters())
+        if hasattr(target, 'buffers'):
+            total += sum(b.numel() * b.element_size() for b in target.buffers())
+        return total
+    except Exception:
+        return None
+
+class ModelRegistry:
+    """Process-wide registry of heavy models and API clients, each built on first use.
+
+    `register(name, factory)` records how to build a model; `get(name)` builds it once
+    (one loader per model, other models stay usable meanwhile) and every caller shares
+    that instance. Models registered with an idle timeout are unloaded by a background
+    reaper when unused for that long and transparently rebuilt on the next `get`.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+        self._lock = threading.RLock()
+        self._load_locks = {}
+        self._info = {}
+        self._reaper = None
+
+    def register(self, name, factory, idle_timeout=None):
+        with self._lock:
+            self._factories[name] = factory
+            self._load_locks.setdefault(name, threading.Lock())
+            self._info[name] = {
+                'loaded': False, 'loads': 0, 'load_failures': 0, 'uses': 0, 'unloads': 0,
+                'load_seconds': None, 'bytes': None, 'last_used': None, 'last_error': None,
+                'idle_timeout': idle_timeout or None
+            }
+        if idle_timeout:
+            self._start_reaper()
+
+    def is_loaded(self, name):
+        with self._lock:
+            return name in self._models
+
+    def get(self, name):
+        """Return the shared instance of a model, loading it on first use. Raises if the factory fails."""
+        with self._lock:
+            if name not in self._factories:
+                raise KeyError(f"Unknown model: {name}")
+            if name in self._models:
+                self._touch(name)
+                return self._models[name]
+            load_lock = self._load_locks[name]
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._touch(name)
+                    return self._models[name]
+            started = time.time()
+            try:
+                model = self._factories[name]()
+            except Exception as e:
+                with self._lock:
+                    self._info[name]['load_failures'] += 1
+                    self._info[name]['last_error'] = str(e)
+                logger.error(f"Failed to load model {name}: {e}")
+                raise
+            elapsed = time.time() - started
+            with self._lock:
+                self._models[name] = model
+                info = self._info[name]
+                info.update({'loaded': True, 'load_seconds': round(elapsed, 3), 'bytes': estimate_model_bytes(model), 'last_error': None})
+                info['loads'] += 1
+                self._touch(name)
+            logger.info(f"Loaded model {name} in {elapsed:.2f}s")
+            return model
+
+    def _touch(self, name):
+        self._info[name]['uses'] += 1
+        self._info[name]['last_used'] = time.time()
+
+    def unload(self, name):
+        """Drop a loaded model; the next get() rebuilds it"""
+        with self._load_locks.get(name, threading.Lock()):
+            with self._lock:
+                if self._models.pop(name, None) is None:
+                    return False
+                self._info[name]['loaded'] = False
+                self._info[name]['unloads'] += 1
+        logger.info(f"Unloaded model {name}")
+        return True
+
+    def warm_up(self, names, background=True):
+        """Load the given models now, optionally on a daemon thread. Returns the thread (or None)."""
+        def run():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception:
+                    pass
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_loop, name='model-reaper', daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(MODEL_REGISTRY_CONFIG['idle_check_seconds'])
+            self.unload_idle()
+
+    def unload_idle(self, now=None):
+        """Unload every model whose idle timeout has passed. Returns the names unloaded."""
+        now = now or time.time()
+        with self._lock:
+            idle = [name for name, info in self._info.items()
+                    if info['idle_timeout'] and name in self._models
+                    and info['last_used'] and now - info['last_used'] > info['idle_timeout']]
+        return [name for name in idle if self.unload(name)]
+
+    def stats(self):
+        """Per-model load time, estimated resident bytes and usage for the monitoring endpoints"""
+        with self._lock:
+            return {name: {**info, 'last_used': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(info['last_used'])) if info['last_used'] else None}
+                    for name, info in self._info.items()}
+
+class LazyModel:
+    """Stand-in that resolves a registry model on first attribute access.
+
+    Lets module-level names such as `ollama_client` or `elevenlabs_client` keep working unchanged
+    while the real object is only built when a request first needs it.
+    """
+
+    def __init__(self, registry, name):
+        self._registry = registry
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._registry.get(self._name), attr)
+
+    def __call__(self, *args, **kwargs):
+        return self._registry.get(self._name)(*args, **kwargs)
+
+    def __repr__(self):
+        state = 'loaded' if self._registry.is_loaded(self._name) else 'not loaded'
+        return f"<LazyModel {self._name} ({state})>"
+
+# Shared process-wide registry
+model_registry = ModelRegistry()
@@ -0,0 +1,219 @@
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Maximal-marginal-relevance (diversity) re-ranking configuration
+MMR_CONFIG = {
+    'enabled': os.getenv('MMR_ENABLED', 'true').lower() == 'true',
+    'lambda': float(os.getenv('MMR_LAMBDA', 0.7)),  # 1.0 ranks by relevance only, 0.0 by novelty only
+    'output_size': int(os.getenv('MMR_OUTPUT_SIZE', 8)),  # Chunks kept for the prompt
+}
+
+# Cross-encoder re-ranking configuration
+CROSS_ENCODER_CONFIG = {
+    'model': os.getenv('CROSS_ENCODER_MODEL', 'cross-encoder/mmarco-mMiniLMv2-L12-H384-v1'),  # Multilingual, like the embedder
+    'default_enabled': os.getenv('CROSS_ENCODER_RERANK', 'false').lower() == 'true',  # Agents without 'crossEncoderRerank' use this
+    'top_n': int(os.getenv('CROSS_ENCODER_TOP_N', 5)),  # Chunks kept after re-ranking
+    'budget_ms': float(os.getenv('CROSS_ENCODER_BUDGET_MS', 300)),  # Past this, keep retrieval order
+    'batch_size': int(os.getenv('CROSS_ENCODER_BATCH_SIZE', 8)),  # Pairs scored per forward pass; the budget is checked between passes
+    'max_length': 256,
+}
+
+# Adaptive top-k configuration: how many retrieved chunks go to the prompt
+ADAPTIVE_K_CONFIG = {
+    'enabled': os.getenv('ADAPTIVE_TOP_K', 'true').lower() == 'true',
+    'threshold': float(os.getenv('ADAPTIVE_K_THRESHOLD', 0.35)),  # Minimum query/chunk cosine similarity
+    'gap': float(os.getenv('ADAPTIVE_K_GAP', 0.15)),  # Cut where similarity drops by more than this from one chunk to the next
+    'min_k': int(os.getenv('ADAPTIVE_K_MIN', 4)),
+    'max_k': int(os.getenv('ADAPTIVE_K_MAX', 20)),
+}
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def cosine_similarities(query_vector, doc_vectors):
+    """Cosine similarity of each row of doc_vectors to the query"""
+    doc_vectors = _normalize_rows(np.asarray(doc_vectors, dtype='float32'))
+    query = _normalize_rows(np.asarray(query_vector, dtype='float32').reshape(1, -1))[0]
+    return doc_vectors @ query
+
+def adaptive_cutoff(similarities, threshold=None, gap=None, min_k=None, max_k=None):
+    """Number of chunks to keep, given their similarities sorted best first: stop at the first one below
+    `threshold` or more than `gap` below its predecessor, but always keep at least min_k (>= 1) and at most max_k."""
+    threshold = ADAPTIVE_K_CONFIG['threshold'] if threshold is None else threshold
+    gap = ADAPTIVE_K_CONFIG['gap'] if gap is None else gap
+    min_k = max(1, ADAPTIVE_K_CONFIG['min_k'] if min_k is None else int(min_k))
+    max_k = ADAPTIVE_K_CONFIG['max_k'] if max_k is None else int(max_k)
+    limit = min(max_k, len(similarities))
+    k = 0
+    while k < limit:
+        if k >= min_k and (similarities[k] < threshold or similarities[k - 1] - similarities[k] > gap):
+            break
+        k += 1
+    return k
+
+class AdaptiveTopK:
+    """Trims each request's retrieved chunks with adaptive_cutoff() and keeps the chosen-k distribution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.metrics = {'requests': 0, 'chunks_in': 0, 'chunks_out': 0, 'k_histogram': {}}
+
+    def select(self, docs, similarities, overrides=None, agent_id=None):
+        """Return the k most query-similar docs, in their retrieval order.
+
+        The cutoff is found on the similarities sorted best first, since retrieval order (e.g. RRF)
+        need not follow them. `overrides` is an agent's optional {"threshold", "gap", "minK", "maxK"}.
+        """
+        overrides = overrides or {}
+        order = sorted(range(len(docs)), key=lambda i: -similarities[i])
+        ranked = [similarities[i] for i in order]
+        k = adaptive_cutoff(ranked, overrides.get('threshold'), overrides.get('gap'),
+                            overrides.get('minK'), overrides.get('maxK'))
+        if len(ranked):
+            logger.info(f"Adaptive top-k for {agent_id or 'general'}: kept {k} of {len(docs)} "
+                        f"(similarity max {ranked[0]:.3f}, median {float(np.median(ranked)):.3f}, "
+                        f"min {ranked[-1]:.3f}, cut at {ranked[k - 1] if k else float('nan'):.3f})")
+        with self._lock:
+            self.metrics['requests'] += 1
+            self.metrics['chunks_in'] += len(docs)
+            self.metrics['chunks_out'] += k
+            self.metrics['k_histogram'][k] = self.metrics['k_histogram'].get(k, 0) + 1
+        kept = set(order[:k])
+        return [doc for i, doc in enumerate(docs) if i in kept]
+
+    def stats(self):
+        with self._lock:
+            requests = self.metrics['requests']
+            return {
+                **self.metrics,
+                'k_histogram': dict(sorted(self.metrics['k_histogram'].items())),
+                'avg_k': round(self.metrics['chunks_out'] / requests, 2) if requests else 0
+            }
+
+def mmr_select(query_vector, doc_vectors, k, lambda_mult=None):
+    """Indices of k rows of doc_vectors chosen greedily by maximal marginal relevance.
+
+    Each step picks argmax(lambda * sim(query, d) - (1 - lambda) * max sim(d, already chosen)),
+    using cosine similarity; the running max is updated with one matrix column per step.
+    """
+    lambda_mult = MMR_CONFIG['lambda'] if lambda_mult is None else lambda_mult
+    doc_vectors = _normalize_rows(np.asarray(doc_vectors, dtype='float32'))
+    k = min(k, len(doc_vectors))
+    if k <= 0:
+        return []
+    relevance = cosine_similarities(query_vector, doc_vectors)
+    similarity = doc_vectors @ doc_vectors.T
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(len(doc_vectors), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
+
+def mmr_documents(docs, query_vector, doc_vectors, k=None, lambda_mult=None):
+    """Re-order and trim already-retrieved documents by MMR over their stored vectors"""
+    k = k or MMR_CONFIG['output_size']
+    if len(docs) <= 1:
+        return list(docs)
+    return [docs[i] for i in mmr_select(query_vector, doc_vectors, k, lambda_mult)]
+
+class CrossEncoderReranker:
+    """Scores (query, chunk) pairs with a CPU cross-encoder from the model registry and keeps the top n.
+
+    Pairs are scored in batches and the millisecond budget is checked before each batch (using
+    the slowest batch so far as the estimate); if the budget would be exceeded, or the model is
+    not loaded yet, the documents are returned in retrieval order. A model that is not loaded is
+    loaded in the background so later requests can use it.
+    """
+
+    def __init__(self, registry, model_name='cross_encoder'):
+        self.registry = registry
+        self.model_name = model_name
+        self._lock = threading.Lock()
+        self._loading = False
+        self._agents = {}  # agent key -> timing and outcome counters
+
+    def _record(self, agent_id, outcome, seconds):
+        with self._lock:
+            entry = self._agents.setdefault(agent_id or '__general__', {
+                'reranked': 0, 'over_budget': 0, 'model_not_loaded': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry[outcome] += 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+
+    def _load_in_background(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def load():
+            try:
+                self.registry.get(self.model_name)
+            except Exception as e:
+                logger.error(f"Error loading cross-encoder: {e}")
+            finally:
+                with self._lock:
+                    self._loading = False
+
+        threading.Thread(target=load, name='cross-encoder-load', daemon=True).start()
+
+    def rerank(self, query, docs, top_n=None, budget_ms=None, agent_id=None):
+        """Return (docs, applied): the top_n docs by cross-encoder score, or the input unchanged with applied=False"""
+        top_n = top_n or CROSS_ENCODER_CONFIG['top_n']
+        budget = float(budget_ms or CROSS_ENCODER_CONFIG['budget_ms']) / 1000
+        if len(docs) <= 1:
+            return docs, False
+        started = time.time()
+        if not self.registry.is_loaded(self.model_name):
+            self._load_in_background()
+            self._record(agent_id, 'model_not_loaded', 0)
+            return docs, False
+        pairs = [(query, doc.page_content) for doc in docs]
+        batch_size = CROSS_ENCODER_CONFIG['batch_size']
+        scores = []
+        slowest = 0.0
+        try:
+            model = self.registry.get(self.model_name)
+            for start in range(0, len(pairs), batch_size):
+                if time.time() - started + slowest > budget:
+                    elapsed = time.time() - started
+                    logger.info(f"Cross-encoder budget of {budget * 1000:.0f}ms reached after {start} of {len(pairs)} pairs; keeping retrieval order")
+                    self._record(agent_id, 'over_budget', elapsed)
+                    return docs, False
+                batch_started = time.time()
+                scores.extend(np.asarray(model.predict(pairs[start:start + batch_size], show_progress_bar=False)).reshape(-1).tolist())
+                slowest = max(slowest, time.time() - batch_started)
+        except Exception as e:
+            logger.error(f"Cross-encoder re-ranking failed, keeping retrieval order: {e}")
+            self._record(agent_id, 'errors', time.time() - started)
+            return docs, False
+        order = np.argsort(-np.asarray(scores))[:top_n]
+        elapsed = time.time() - started
+        self._record(agent_id, 'reranked', elapsed)
+        logger.info(f"Cross-encoder kept {len(order)} of {len(docs)} chunks in {elapsed * 1000:.1f}ms")
+        return [docs[i] for i in order], True
+
+    def stats(self):
+        """Per-agent outcome counts and latency for the monitoring endpoints"""
+        with self._lock:
+            stats = {}
+            for agent, entry in self._agents.items():
+                calls = entry['reranked'] + entry['over_budget'] + entry['model_not_loaded'] + entry['errors']
+                stats[agent] = {**entry, 'total_ms': round(entry['total_ms'], 1), 'max_ms': round(entry['max_ms'], 1),
+                                'avg_ms': round(entry['total_ms'] / calls, 1) if calls else 0}
+            return {'model': CROSS_ENCODER_CONFIG['model'], 'loaded': self.registry.is_loaded(self.model_name), 'agents': stats}
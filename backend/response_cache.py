@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Exact-match answer cache configuration
+RESPONSE_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('RESPONSE_CACHE_SIZE', 1000)),  # Answers kept in memory
+    'ttl_seconds': int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', 24 * 3600)),
+    'disk_path': os.getenv('RESPONSE_CACHE_PATH') or None,  # sqlite file for an optional disk tier; unset keeps memory only
+    'disk_max_entries': int(os.getenv('RESPONSE_CACHE_DISK_SIZE', 20000)),
+}
+
+FEDERATED_PREFIX = 'federated:'
+
+def federated_cache_agent(agent_ids):
+    """Cache owner of a federated request: its own key, so its answers never mix with single-agent ones"""
+    return FEDERATED_PREFIX + ','.join(sorted(agent_ids))
+
+def covers_agent(cache_agent, agent_id):
+    """True if answers cached under cache_agent depend on agent_id: the agent itself or a federated key naming it"""
+    if cache_agent == agent_id:
+        return True
+    return (isinstance(cache_agent, str) and cache_agent.startswith(FEDERATED_PREFIX)
+            and agent_id in cache_agent[len(FEDERATED_PREFIX):].split(','))
+
+def response_cache_key(agent_id, source, model, normalized_query, index_version):
+    """sha256 over everything that determines an answer; a changed index version yields a new key"""
+    payload = json.dumps({
+        'agent': agent_id, 'source': source, 'model': model,
+        'query': normalized_query, 'index': index_version
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """LRU of finished chat answers with a TTL and an optional sqlite disk tier.
+
+    Keys include the index version of the sources an answer was built from, so re-indexing a
+    file makes older answers unreachable; `invalidate_agent` drops an agent's answers outright.
+    """
+
+    def __init__(self, max_entries=None, ttl_seconds=None, disk_path=None):
+        self.max_entries = max_entries or RESPONSE_CACHE_CONFIG['max_entries']
+        self.ttl_seconds = ttl_seconds or RESPONSE_CACHE_CONFIG['ttl_seconds']
+        self.disk_path = disk_path or RESPONSE_CACHE_CONFIG['disk_path']
+        self._entries = OrderedDict()  # key -> (agent_id, created_at, answer)
+        self._lock = threading.Lock()
+        self._conn = None
+        if self.disk_path:
+            self._conn = sqlite3.connect(self.disk_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, agent_id TEXT, created_at REAL, answer TEXT)')
+            self._conn.commit()
+        self.metrics = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0, 'bypassed': 0}
+
+    def _expired(self, created_at):
+        return time.time() - created_at > self.ttl_seconds
+
+    def get(self, key):
+        """Return a cached answer dict, or None on a miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._expired(entry[1]):
+                    del self._entries[key]
+                    self.metrics['expired'] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.metrics['hits'] += 1
+                    return entry[2]
+            if self._conn is not None:
+                row = self._conn.execute('SELECT agent_id, created_at, answer FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    answer = json.loads(row[2])
+                    self._remember(key, row[0], row[1], answer)
+                    self.metrics['disk_hits'] += 1
+                    return answer
+            self.metrics['misses'] += 1
+            return None
+
+    def _remember(self, key, agent_id, created_at, answer):
+        self._entries[key] = (agent_id, created_at, answer)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics['evictions'] += 1
+
+    def put(self, key, agent_id, answer):
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, agent_id, created_at, answer)
+            if self._conn is not None:
+                try:
+                    self._conn.execute('INSERT OR REPLACE INTO responses (key, agent_id, created_at, answer) VALUES (?, ?, ?, ?)',
+                                       (key, agent_id, created_at, json.dumps(answer, ensure_ascii=False, default=str)))
+                    self._conn.execute('DELETE FROM responses WHERE created_at < ?', (created_at - self.ttl_seconds,))
+                    self._conn.execute('DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)',
+                                       (RESPONSE_CACHE_CONFIG['disk_max_entries'],))
+                    self._conn.commit()
+                except Exception as e:
+                    logger.error(f"Error writing response cache entry: {e}")
+
+    def record_bypass(self):
+        with self._lock:
+            self.metrics['bypassed'] += 1
+
+    def invalidate_agent(self, agent_id):
+        """Drop every cached answer for one agent, including federated answers that searched it
+        (e.g. after its sources or prompt changed)"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if covers_agent(entry[0], agent_id)]
+            for key in stale:
+                del self._entries[key]
+            if self._conn is not None:
+                federated = [row[0] for row in self._conn.execute(
+                    'SELECT DISTINCT agent_id FROM responses WHERE agent_id LIKE ?', (FEDERATED_PREFIX + '%',))]
+                owners = [agent_id] + [owner for owner in federated if covers_agent(owner, agent_id)]
+                self._conn.executemany('DELETE FROM responses WHERE agent_id IS ?', [(owner,) for owner in owners])
+                self._conn.commit()
+            self.metrics['invalidations'] += 1
+
+    def stats(self):
+        """Hit/miss counters for the monitoring endpoints"""
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['disk_hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'hit_rate': round((self.metrics['hits'] + self.metrics['disk_hits']) / lookups * 100, 2) if lookups else 0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'disk_tier': bool(self._conn)
+            }
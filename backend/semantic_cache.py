@@ -0,0 +1,136 @@
+import os
+import time
+import logging
+import threading
+
+import numpy as np
+import faiss
+
+from backend.sparse_index import tokenize
+from backend.response_cache import covers_agent
+
+logger = logging.getLogger(__name__)
+
+def identifier_tokens(query):
+    """Tokens containing a digit ("43a", "377", "2019"): a paraphrase must repeat them exactly to share an answer"""
+    return frozenset(token for token in tokenize(query) if any(ch.isdigit() for ch in token))
+
+# Semantic answer cache configuration
+SEMANTIC_CACHE_CONFIG = {
+    'enabled': os.getenv('SEMANTIC_CACHE', 'true').lower() == 'true',
+    'threshold': float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.95)),  # Minimum cosine similarity between questions
+    'max_entries_per_agent': int(os.getenv('SEMANTIC_CACHE_SIZE', 2000)),
+    'candidates': 5,  # Nearest cached questions checked for a matching model/source
+}
+
+class SemanticAnswerCache:
+    """Reuses answers for near-duplicate questions.
+
+    Each agent gets a small inner-product FAISS index over normalized query embeddings. A
+    cached answer is returned when a new question is at least `threshold` cosine-similar to a
+    cached one asked with the same model, source filter and answer language, naming exactly the same
+    identifiers (section / rule numbers, which embeddings barely tell apart), and every chunk the cached answer
+    cited still exists unchanged (chunk ids are content-addressed, so `chunk_exists(chunk_id)`
+    is false once the text behind a citation was re-indexed or removed).
+    """
+
+    def __init__(self, chunk_exists, threshold=None, max_entries_per_agent=None):
+        self.chunk_exists = chunk_exists
+        self.threshold = threshold or SEMANTIC_CACHE_CONFIG['threshold']
+        self.max_entries = max_entries_per_agent or SEMANTIC_CACHE_CONFIG['max_entries_per_agent']
+        self._indexes = {}  # agent key -> IndexIDMap2(IndexFlatIP)
+        self._entries = {}  # agent key -> {int id: entry}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'stale': 0, 'identifier_mismatches': 0, 'stores': 0, 'evictions': 0,
+                        'saved_llm_seconds': 0.0}
+
+    @staticmethod
+    def _agent_key(agent_id):
+        return agent_id or '__general__'
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype='float32').reshape(1, -1)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, agent_id, model, source, query, query_vector, language=None):
+        """Return (answer, similarity) for the best fresh match above the threshold, or (None, None)"""
+        key = self._agent_key(agent_id)
+        identifiers = identifier_tokens(query)
+        query = self._normalize(query_vector)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.ntotal == 0 or index.d != query.shape[1]:
+                self.metrics['misses'] += 1
+                return None, None
+            scores, labels = index.search(query, min(SEMANTIC_CACHE_CONFIG['candidates'], index.ntotal))
+            entries = self._entries[key]
+            for score, label in zip(scores[0], labels[0]):
+                if label == -1 or score < self.threshold:
+                    break
+                entry = entries.get(int(label))
+                if entry is None or entry['model'] != model or entry['source'] != source or entry['language'] != language:
+                    continue
+                if entry['identifiers'] != identifiers:
+                    # "Section 43A" vs "Section 43B": close in embedding space, different answers
+                    self.metrics['identifier_mismatches'] += 1
+                    continue
+                if not all(self.chunk_exists(chunk_id) for chunk_id in entry['chunk_ids']):
+                    # The cited text changed; this answer can never be served again
+                    index.remove_ids(np.array([label], dtype='int64'))
+                    del entries[int(label)]
+                    self.metrics['stale'] += 1
+                    continue
+                self.metrics['hits'] += 1
+                self.metrics['saved_llm_seconds'] += entry['generation_seconds']
+                return entry['answer'], float(score)
+            self.metrics['misses'] += 1
+            return None, None
+
+    def store(self, agent_id, model, source, query, query_vector, answer, chunk_ids, generation_seconds, language=None):
+        """Remember an answer (written in `language`) with the chunk ids it cited and how long it took to generate"""
+        key = self._agent_key(agent_id)
+        vector = self._normalize(query_vector)
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is None or index.d != vector.shape[1]:
+                index = self._indexes[key] = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+                self._entries[key] = {}
+            entries = self._entries[key]
+            entry_id = self._next_id
+            self._next_id += 1
+            index.add_with_ids(vector, np.array([entry_id], dtype='int64'))
+            entries[entry_id] = {
+                'model': model, 'source': source, 'language': language,
+                'identifiers': identifier_tokens(query), 'answer': answer, 'chunk_ids': list(chunk_ids),
+                'generation_seconds': generation_seconds, 'created_at': time.time()
+            }
+            self.metrics['stores'] += 1
+            if len(entries) > self.max_entries:
+                # Entries are numbered in insertion order, so the smallest ids are the oldest
+                oldest = sorted(entries)[:len(entries) - self.max_entries]
+                index.remove_ids(np.array(oldest, dtype='int64'))
+                for entry_id in oldest:
+                    del entries[entry_id]
+                self.metrics['evictions'] += len(oldest)
+
+    def invalidate_agent(self, agent_id):
+        """Drop the agent's entries and those of every federated key that searched it"""
+        with self._lock:
+            for key in [key for key in self._entries if key == self._agent_key(agent_id) or covers_agent(key, agent_id)]:
+                self._indexes.pop(key, None)
+                self._entries.pop(key, None)
+
+    def stats(self):
+        """Hit rate and saved LLM time for the monitoring endpoints"""
+        with self._lock:
+            lookups = self.metrics['hits'] + self.metrics['misses']
+            return {
+                **self.metrics,
+                'saved_llm_seconds': round(self.metrics['saved_llm_seconds'], 3),
+                'hit_rate': round(self.metrics['hits'] / lookups * 100, 2) if lookups else 0,
+                'threshold': self.threshold,
+                'entries': {key: len(entries) for key, entries in self._entries.items()}
+            }
@@ -0,0 +1,604 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import faiss
+from langchain_core.documents import Document
+
+from backend.utils import add_vectors_in_batches
+from backend.sparse_index import BM25Index, HYBRID_CONFIG, reciprocal_rank_fusion
+from backend.index_factory import (
+    INDEX_CONFIG, choose_index_spec, supports_remove, needs_training, is_quantized, empty_index, build_index,
+    search_parameters, reconstruct_ids, evaluate_index, index_bytes_per_vector, FullPrecisionVectors, rerank_exact,
+    read_index_file, warm_pages, sweep_stale_full_precision
+)
+
+logger = logging.getLogger(__name__)
+
+# Runs the dense and sparse legs of a hybrid query side by side
+_search_pool = ThreadPoolExecutor(max_workers=HYBRID_CONFIG['search_threads'], thread_name_prefix='hybrid-search')
+
+class LegMetrics:
+    """Call counts and latency per retrieval leg (dense, sparse, fusion)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._legs = {}
+
+    def record(self, leg, seconds):
+        with self._lock:
+            entry = self._legs.setdefault(leg, {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            entry['calls'] += 1
+            entry['total_ms'] += seconds * 1000
+            entry['max_ms'] = max(entry['max_ms'], seconds * 1000)
+
+    def stats(self):
+        with self._lock:
+            return {leg: {'calls': entry['calls'],
+                          'avg_ms': round(entry['total_ms'] / entry['calls'], 2) if entry['calls'] else 0,
+                          'max_ms': round(entry['max_ms'], 2)}
+                    for leg, entry in self._legs.items()}
+
+class SharedVectorStore:
+    """A single FAISS index holding every chunk exactly once.
+
+    Chunks are grouped by source file. The general retriever searches the whole index and
+    each agent retriever is a view restricted (inside FAISS, via an ID selector) to the
+    sources the agent uses, so a file shared by several agents is embedded and stored once.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self.index = None
+        self.documents = {}  # FAISS int64 id -> Document
+        self.chunk_to_id = {}  # chunk_id -> FAISS int64 id
+        self.source_ids = {}  # source filename -> np.ndarray of FAISS ids
+        self.source_versions = {}  # source filename -> change counter
+        self.source_keys = {}  # source filename -> snapshot key of the content it was loaded from
+        self.version = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+        self.sparse = BM25Index()  # BM25 over the same int64 ids, built at ingest
+        self.leg_metrics = LegMetrics()
+        self.index_spec = {'type': 'flat'}
+        self.index_report = None  # Recall/latency measured when the index was last built
+        self._tombstones = set()  # Removed ids still inside an index that cannot delete (HNSW)
+        self._rebuild_pending = False  # A background rebuild to purge tombstones is queued or running
+        self._full = None  # FullPrecisionVectors on disk while the index is quantized
+        self._mapped = 'none'  # How much of self.index is a read-only memory map of a persisted file (see mapped_layout)
+        self.persisted_version = None  # Store version last saved or loaded by persist() / load_persisted()
+        self.persist_report = None
+        sweep_stale_full_precision()
+
+    def _bump(self, source):
+        self.version += 1
+        self.source_versions[source] = self.source_versions.get(source, 0) + 1
+
+    def _ensure_index(self, dim):
+        if self.index is None:
+            # IVF and quantized indexes need training data, so an empty store always starts flat; rebuild_index() upgrades it
+            if needs_training(self.index_spec):
+                self.index_spec = {'type': 'flat'}
+                self._drop_full_precision()
+            # IDMap2 keeps ids stable across removals, so per-source id sets never need renumbering
+            self.index = empty_index(self.index_spec, dim)
+
+    def _ensure_writable(self):
+        """A memory-mapped index is read-only; give this process a private copy before the first change"""
+        if self._mapped != 'none':
+            logger.info("Copying the memory-mapped index into private memory before modifying it")
+            try:
+                self.index = faiss.clone_index(self.index)
+            except RuntimeError:
+                # Older FAISS releases cannot clone memory-mapped inverted lists; round-trip through a buffer instead
+                self.index = faiss.deserialize_index(faiss.serialize_index(self.index))
+            self._mapped = 'none'
+
+    def _drop_full_precision(self):
+        if self._full is not None:
+            self._full.close()
+            self._full = None
+
+    def live_count(self):
+        with self._lock:
+            return (self.index.ntotal if self.index is not None else 0) - len(self._tombstones)
+
+    def has_source(self, source):
+        with self._lock:
+            return source in self.source_ids
+
+    def sources(self):
+        with self._lock:
+            return list(self.source_ids.keys())
+
+    def add_file(self, source, documents, vectors, snapshot_key=None):
+        """Insert or replace every chunk of one source file. Returns the number of chunks added."""
+        with self._lock:
+            self.remove_source(source)
+            if not documents:
+                return 0
+            vectors = np.ascontiguousarray(vectors, dtype='float32')
+            self._ensure_index(vectors.shape[1])
+            self._ensure_writable()
+            ids = np.arange(self._next_id, self._next_id + len(documents), dtype='int64')
+            self._next_id += len(documents)
+            add_vectors_in_batches(self.index, vectors, ids)
+            if self._full is not None:
+                self._full.append(ids, vectors)
+            for int_id, doc in zip(ids.tolist(), documents):
+                self.documents[int_id] = doc
+                chunk_id = doc.metadata.get('chunk_id')
+                if chunk_id:
+                    self.chunk_to_id[chunk_id] = int_id
+            self.sparse.add(ids.tolist(), [doc.page_content for doc in documents])
+            self.source_ids[source] = ids
+            if snapshot_key:
+                self.source_keys[source] = snapshot_key
+            self._bump(source)
+            return len(documents)
+
+    def remove_source(self, source):
+        """Remove every chunk of one source file. Returns the number of chunks removed."""
+        with self._lock:
+            ids = self.source_ids.get(source)
+            if ids is None or not len(ids):
+                self.source_ids.pop(source, None)
+                self.source_keys.pop(source, None)
+                return 0
+            if supports_remove(self.index_spec):
+                self._ensure_writable()
+                self.index.remove_ids(ids)
+            else:
+                self._tombstones.update(ids.tolist())
+            del self.source_ids[source]
+            self.source_keys.pop(source, None)
+            if self._full is not None:
+                self._full.discard(ids)
+            removed = []
+            for int_id in ids.tolist():
+                doc = self.documents.pop(int_id, None)
+                if doc is not None:
+                    self.chunk_to_id.pop(doc.metadata.get('chunk_id'), None)
+                    removed.append((int_id, doc.page_content))
+            self.sparse.remove([int_id for int_id, _ in removed], [text for _, text in removed])
+            self._bump(source)
+            if self._needs_purge():
+                self._schedule_rebuild()
+            return len(ids)
+
+    def _needs_purge(self):
+        return bool(self._tombstones) and self.index is not None and len(self._tombstones) > 0.2 * self.index.ntotal
+
+    def _schedule_rebuild(self):
+        """Mark the index for a rebuild and run it on a background thread; callers never wait for it"""
+        if self._rebuild_pending:
+            return
+        self._rebuild_pending = True
+        threading.Thread(target=self._purge_tombstones, name='shared-store-rebuild', daemon=True).start()
+
+    def _purge_tombstones(self):
+        try:
+            # rebuild_index() gives up if the store changed while it was building; try again a few times
+            for _ in range(3):
+                with self._lock:
+                    if not self._needs_purge():
+                        return
+                    index_type, quantization = self.index_spec['type'], self.index_spec.get('quantization')
+                if self.rebuild_index(index_type, quantization) is not None:
+                    return
+        except Exception as e:
+            logger.error(f"Error rebuilding the vector index to purge tombstones: {e}")
+        finally:
+            with self._lock:
+                self._rebuild_pending = False
+
+    def clear(self):
+        """Drop every source and the index itself"""
+        with self._lock:
+            for source in list(self.source_ids):
+                self._bump(source)
+            self.index = None
+            self.index_spec = {'type': 'flat'}
+            self._tombstones = set()
+            self._drop_full_precision()
+            self._mapped = 'none'
+            self.index_report = None
+            self.documents = {}
+            self.chunk_to_id = {}
+            self.source_ids = {}
+            self.source_keys = {}
+            self.sparse = BM25Index()
+
+    def ids_for_sources(self, sources):
+        """FAISS ids of every chunk belonging to the given sources"""
+        with self._lock:
+            arrays = [self.source_ids[source] for source in sources if source in self.source_ids]
+        if not arrays:
+            return np.empty(0, dtype='int64')
+        return np.concatenate(arrays)
+
+    def search_by_vector(self, vector, k, allowed_ids=None, search_params=None):
+        """Return [(Document, L2 distance)] for the k nearest chunks, optionally restricted to allowed_ids.
+
+        `search_params` overrides efSearch (HNSW) or nprobe (IVF) for this search. On a quantized
+        index, k * rerank_factor candidates are fetched and re-ranked with exact distances.
+        """
+        return self.search_by_vectors(np.asarray(vector, dtype='float32').reshape(1, -1), k, allowed_ids, search_params)[0]
+
+    def search_by_vectors(self, vectors, k, allowed_ids=None, search_params=None):
+        """search_by_vector() for a matrix of queries in one FAISS call; returns one result list per row"""
+        queries = np.ascontiguousarray(vectors, dtype='float32')
+        with self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return [[] for _ in range(len(queries))]
+            selector = None
+            if allowed_ids is not None:
+                if not len(allowed_ids):
+                    return [[] for _ in range(len(queries))]
+                selector = faiss.IDSelectorBatch(len(allowed_ids), faiss.swig_ptr(allowed_ids))
+                k = min(k, len(allowed_ids))
+            elif self._tombstones:
+                dead = np.fromiter(self._tombstones, dtype='int64')
+                selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(len(dead), faiss.swig_ptr(dead)))
+            params = search_parameters(self.index_spec, selector, search_params)
+            fetch = k * INDEX_CONFIG['rerank_factor'] if self._full is not None else k
+            distances, labels = self.index.search(queries, min(fetch, self.index.ntotal), params=params)
+            results = []
+            for query, row_labels, row_distances in zip(queries, labels, distances):
+                hits = [(int(label), float(distance)) for label, distance in zip(row_labels, row_distances)
+                        if label != -1 and int(label) in self.documents]
+                if self._full is not None:
+                    hits = rerank_exact(query, np.array([label for label, _ in hits], dtype='int64'), self._full, k)
+                results.append([(self.documents[label], distance) for label, distance in hits])
+            return results
+
+    def rebuild_index(self, index_type=None, quantization=None):
+        """Rebuild the vector index as Flat, HNSW or IVF (default: INDEX_CONFIG, 'auto' picks by corpus size),
+        optionally storing SQ8 or PQ codes instead of float32 vectors.
+
+        Vectors are read back from the current index (or the full-precision file when it is
+        quantized), the new one is trained and filled off the lock, and recall/latency against
+        exact search plus bytes per vector are kept in `index_report`. Returns the report, or
+        None if there was nothing to build.
+        """
+        with self._lock:
+            if self.index is None:
+                return None
+            version = self.version
+            ids = np.concatenate(list(self.source_ids.values())) if self.source_ids else np.empty(0, dtype='int64')
+            if not len(ids):
+                # Only dead vectors left; start over from an empty flat index
+                self.index = None
+                self.index_spec = {'type': 'flat'}
+                self._tombstones = set()
+                self._drop_full_precision()
+                return None
+            vectors = self._full.get(ids) if self._full is not None else reconstruct_ids(self.index, ids)
+            bytes_before = self.index_report['bytes_per_vector']['after'] if self.index_report else self.index.d * 4
+        spec = choose_index_spec(len(ids), index_type, quantization)
+        started = time.time()
+        index = build_index(spec, vectors, ids)
+        full = None
+        if is_quantized(spec):
+            # Written compacted: rows of removed ids are left behind in the old file
+            full = FullPrecisionVectors(vectors.shape[1])
+            full.append(ids, vectors)
+        build_seconds = time.time() - started
+        report = {
+            'type': spec['type'],
+            'quantization': spec['quantization'],
+            'spec': spec,
+            'vectors': len(ids),
+            'build_seconds': round(build_seconds, 3),
+            'bytes_per_vector': {
+                'float32': vectors.shape[1] * 4,
+                'before': bytes_before,
+                'after': index_bytes_per_vector(index),
+                'full_precision_on_disk': vectors.shape[1] * 4 if full is not None else 0
+            },
+            **evaluate_index(index, vectors, ids, spec)
+        }
+        with self._lock:
+            if self.version != version:
+                logger.warning("Shared store changed while the index was rebuilding; keeping the current index")
+                if full is not None:
+                    full.close()
+                return None
+            self.index = index
+            self.index_spec = spec
+            self.index_report = report
+            self._tombstones = set()
+            self._drop_full_precision()
+            self._full = full
+            self._mapped = 'none'
+        logger.info(f"Vector index rebuilt: {report}")
+        return report
+
+    def optimize_index(self):
+        """Switch to the index type and quantization INDEX_CONFIG asks for at the current corpus size, if that differs"""
+        spec = choose_index_spec(self.live_count())
+        if (spec['type'] == self.index_spec['type'] and spec['quantization'] == self.index_spec.get('quantization', 'none')
+                and not self._tombstones):
+            return None
+        return self.rebuild_index(spec['type'], spec['quantization'])
+
+    def persist(self, folder=None):
+        """Save the index, its documents and ids as a new generation under `folder` for other processes to map.
+
+        Generations are written to a temporary folder and published by atomically replacing the
+        CURRENT pointer, so a reader never sees a half-written index. Returns the generation name.
+        """
+        folder = folder or INDEX_CONFIG['persist_dir']
+        with self._lock:
+            if self.index is None or not self.index.ntotal:
+                return None
+            started = time.time()
+            generation = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            tmp_folder = os.path.join(folder, f".{generation}.tmp")
+            os.makedirs(tmp_folder, exist_ok=True)
+            try:
+                faiss.write_index(self.index, os.path.join(tmp_folder, 'index.faiss'))
+                full_ids = None
+                if self._full is not None:
+                    full_ids = np.concatenate(list(self.source_ids.values())) if self.source_ids else np.empty(0, dtype='int64')
+                    self._full.get(full_ids).tofile(os.path.join(tmp_folder, 'full_precision.f32'))
+                meta = {
+                    'version': self.version,
+                    'next_id': self._next_id,
+                    'spec': self.index_spec,
+                    'report': self.index_report,
+                    'tombstones': sorted(self._tombstones),
+                    'source_ids': {source: ids.tolist() for source, ids in self.source_ids.items()},
+                    'source_keys': self.source_keys,
+                    'full_precision_ids': full_ids.tolist() if full_ids is not None else None,
+                    'documents': {str(int_id): {'page_content': doc.page_content, 'metadata': doc.metadata}
+                                  for int_id, doc in self.documents.items()}
+                }
+                with open(os.path.join(tmp_folder, 'store.json'), 'w', encoding='utf-8') as f:
+                    json.dump(meta, f, ensure_ascii=False, default=str)
+                os.replace(tmp_folder, os.path.join(folder, generation))
+                pointer = os.path.join(folder, f".CURRENT.{os.getpid()}")
+                with open(pointer, 'w') as f:
+                    f.write(generation)
+                os.replace(pointer, os.path.join(folder, 'CURRENT'))
+            except Exception as e:
+                logger.error(f"Error persisting the vector index: {e}")
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+                return None
+            self.persisted_version = self.version
+            self.persist_report = {'generation': generation, 'seconds': round(time.time() - started, 3)}
+        # Keep the newest few generations for processes that loaded one of them; older ones go
+        generations = sorted(name for name in os.listdir(folder)
+                             if name != 'CURRENT' and not name.startswith('.') and os.path.isdir(os.path.join(folder, name)))
+        for name in generations[:-INDEX_CONFIG['keep_generations']]:
+            if name != generation:
+                shutil.rmtree(os.path.join(folder, name), ignore_errors=True)
+        logger.info(f"Persisted vector index generation {generation}")
+        return generation
+
+    def load_persisted(self, folder=None, mmap=None, warm=None):
+        """Replace the store's contents with the current persisted generation. Returns True if one was loaded.
+
+        With mmap (INDEX_CONFIG['mmap']) the index is opened read-only and memory-mapped, so every
+        worker process shares the same page-cache copy; the first local change makes a private copy.
+        The full-precision file is mapped here too, so nothing is opened lazily from a generation
+        that a later persist() may delete.
+        """
+        folder = folder or INDEX_CONFIG['persist_dir']
+        warm = INDEX_CONFIG['warm_pages'] if warm is None else warm
+        mmap = INDEX_CONFIG['mmap'] if mmap is None else mmap
+        try:
+            with open(os.path.join(folder, 'CURRENT')) as f:
+                generation = f.read().strip()
+        except OSError:
+            return False
+        path = os.path.join(folder, generation)
+        started = time.time()
+        try:
+            with open(os.path.join(path, 'store.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            index_path = os.path.join(path, 'index.faiss')
+            index, mapped = read_index_file(index_path, meta['spec'], mmap)
+            warm_seconds = warm_pages(index_path) if warm else None
+            full = None
+            if meta['full_precision_ids'] is not None:
+                full = FullPrecisionVectors(index.d, os.path.join(path, 'full_precision.f32'), meta['full_precision_ids'])
+        except Exception as e:
+            logger.warning(f"Could not load persisted vector index {generation}: {e}")
+            return False
+        documents = {int(int_id): Document(page_content=d['page_content'], metadata=d['metadata'])
+                     for int_id, d in meta['documents'].items()}
+        with self._lock:
+            self.clear()
+            self.index = index
+            self.index_spec = meta['spec']
+            self.index_report = meta['report']
+            self._tombstones = set(meta['tombstones'])
+            self._full = full
+            self._mapped = mapped
+            self._next_id = meta['next_id']
+            self.documents = documents
+            self.chunk_to_id = {doc.metadata['chunk_id']: int_id for int_id, doc in documents.items() if doc.metadata.get('chunk_id')}
+            self.source_ids = {source: np.asarray(ids, dtype='int64') for source, ids in meta['source_ids'].items()}
+            self.source_keys = dict(meta['source_keys'])
+            self.sparse.add(list(documents), [doc.page_content for doc in documents.values()])
+            for source in self.source_ids:
+                self._bump(source)
+            self.persisted_version = self.version
+            self.persist_report = {'generation': generation, 'mapped': mapped,
+                                   'load_seconds': round(time.time() - started, 3),
+                                   'warm_seconds': round(warm_seconds, 3) if warm_seconds is not None else None}
+        logger.info(f"Loaded persisted vector index {generation}: {self.persist_report}")
+        return True
+
+    def retain_sources(self, current_keys):
+        """Drop sources that are gone or whose snapshot key changed since they were loaded. Returns the dropped names."""
+        with self._lock:
+            stale = [source for source in self.source_ids
+                     if source not in current_keys or current_keys[source] != self.source_keys.get(source)]
+            for source in stale:
+                self.remove_source(source)
+        if stale:
+            logger.info(f"Dropped {len(stale)} changed or removed sources from the shared store: {stale}")
+        return stale
+
+    def document_vectors(self, docs):
+        """Stored vectors for documents held by this store, in order (None if any of them is not in the store)"""
+        with self._lock:
+            ids = [self.chunk_to_id.get(doc.metadata.get('chunk_id')) for doc in docs]
+            if self.index is None or any(int_id is None for int_id in ids):
+                return None
+            ids = np.asarray(ids, dtype='int64')
+            if self._full is not None:
+                return self._full.get(ids)
+            return reconstruct_ids(self.index, ids)
+
+    def search_sparse(self, query, k, allowed=None):
+        """Return [(Document, BM25 score)] for the k best keyword matches, optionally restricted to the `allowed` id set"""
+        hits = self.sparse.search(query, k, allowed)
+        with self._lock:
+            return [(self.documents[doc_id], score) for doc_id, score in hits if doc_id in self.documents]
+
+    def hybrid_search(self, query, k, allowed_ids=None, allowed=None, search_params=None):
+        """Dense and BM25 search run in parallel, fused by reciprocal rank. Returns [(Document, RRF score)]."""
+        candidates = max(k, HYBRID_CONFIG['candidates'])
+
+        def dense_leg():
+            started = time.time()
+            results = self.search_by_vector(self.embeddings.embed_query(query), candidates, allowed_ids, search_params)
+            self.leg_metrics.record('dense', time.time() - started)
+            return results
+
+        def sparse_leg():
+            started = time.time()
+            results = self.search_sparse(query, candidates, allowed)
+            self.leg_metrics.record('sparse', time.time() - started)
+            return results
+
+        dense_future = _search_pool.submit(dense_leg)
+        sparse_future = _search_pool.submit(sparse_leg)
+        dense, sparse = dense_future.result(), sparse_future.result()
+        started = time.time()
+        by_chunk = {}
+        rankings = []
+        for results in (dense, sparse):
+            ranking = []
+            for doc, _ in results:
+                key = doc.metadata.get('chunk_id') or id(doc)
+                by_chunk[key] = doc
+                ranking.append(key)
+            rankings.append(ranking)
+        fused = [(by_chunk[key], score) for key, score in reciprocal_rank_fusion(rankings, k)]
+        self.leg_metrics.record('fusion', time.time() - started)
+        return fused
+
+    def batch_search(self, queries, k=20, sources=None, allowed_ids=None, search_params=None):
+        """Embed many queries in one batch and search them in one FAISS call. Returns one [(Document, L2 distance)] list per query."""
+        if not queries:
+            return []
+        if allowed_ids is None and sources is not None:
+            allowed_ids = self.ids_for_sources(sources)
+        vectors = np.asarray(self.embeddings.embed_queries(queries), dtype='float32')
+        return self.search_by_vectors(vectors, k, allowed_ids, search_params)
+
+    def similarity_search_with_score(self, query, k=20, sources=None):
+        """Embed a query and search the whole store, or only the given sources"""
+        allowed_ids = None if sources is None else self.ids_for_sources(sources)
+        return self.search_by_vector(self.embeddings.embed_query(query), k, allowed_ids)
+
+    def as_retriever(self, sources=None, k=20, hybrid=None, search_params=None):
+        """A retriever over the whole store, or a view limited to `sources`"""
+        return StoreRetriever(self, sources=sources, k=k, hybrid=hybrid, search_params=search_params)
+
+    def nbytes(self):
+        """Approximate resident size of the vectors and document text (full-precision vectors on disk not counted)"""
+        with self._lock:
+            if self.index is None:
+                vector_bytes = 0
+            elif self.index_report:
+                vector_bytes = int(self.index.ntotal * self.index_report['bytes_per_vector']['after'])
+            else:
+                vector_bytes = self.index.ntotal * self.index.d * 4
+            text_bytes = sum(len(doc.page_content.encode('utf-8')) for doc in self.documents.values())
+            return vector_bytes + text_bytes + self.sparse.nbytes()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'chunks': self.index.ntotal if self.index is not None else 0,
+                'sources': len(self.source_ids),
+                'version': self.version,
+                'bytes': self.nbytes(),
+                'sparse_terms': len(self.sparse.postings),
+                'index': {'spec': self.index_spec, 'tombstones': len(self._tombstones), 'rebuild_pending': self._rebuild_pending,
+                          'build_report': self.index_report,
+                          'full_precision_bytes_on_disk': self._full.nbytes_on_disk() if self._full is not None else 0,
+                          'memory_mapped': self._mapped, 'persisted': self.persist_report},
+                'retrieval_latency': self.leg_metrics.stats()
+            }
+
+class StoreRetriever:
+    """Retriever view over a SharedVectorStore, optionally limited to a set of sources"""
+
+    def __init__(self, store, sources=None, k=20, hybrid=None, search_params=None):
+        self.vectorstore = store
+        self.search_params = search_params or None  # Per-agent efSearch / nprobe overrides
+        self.sources = list(sources) if sources is not None else None
+        self.search_kwargs = {"k": k}
+        self.hybrid = HYBRID_CONFIG['default_enabled'] if hybrid is None else hybrid
+        self._allowed_ids = None
+        self._allowed_set = None
+        self._allowed_version = None
+
+    def allowed_ids(self):
+        """Membership set of this view as FAISS ids (None means the whole store)"""
+        if self.sources is None:
+            return None
+        if self._allowed_version != self.vectorstore.version:
+            self._allowed_ids = self.vectorstore.ids_for_sources(self.sources)
+            self._allowed_set = set(self._allowed_ids.tolist())
+            self._allowed_version = self.vectorstore.version
+        return self._allowed_ids
+
+    def allowed_set(self):
+        """Same membership as allowed_ids(), as a Python set for the BM25 leg"""
+        return None if self.allowed_ids() is None else self._allowed_set
+
+    def scoped(self, sources):
+        """A narrower view limited to `sources` (and to this view's own sources, if it has any)"""
+        if self.sources is not None:
+            sources = [source for source in sources if source in self.sources]
+        return StoreRetriever(self.vectorstore, sources=sources, k=self.search_kwargs["k"], hybrid=self.hybrid, search_params=self.search_params)
+
+    def search_with_scores(self, query, k=None):
+        """[(Document, score)] with higher scores better: the RRF score for hybrid views, the negated L2 distance otherwise"""
+        k = k or self.search_kwargs["k"]
+        if self.hybrid:
+            return self.vectorstore.hybrid_search(query, k, self.allowed_ids(), self.allowed_set(), self.search_params)
+        started = time.time()
+        vector = self.vectorstore.embeddings.embed_query(query)
+        results = self.vectorstore.search_by_vector(vector, k, self.allowed_ids(), self.search_params)
+        self.vectorstore.leg_metrics.record('dense', time.time() - started)
+        return [(doc, -distance) for doc, distance in results]
+
+    def get_relevant_documents(self, query):
+        return [doc for doc, _ in self.search_with_scores(query)]
+
+    def invoke(self, query):
+        return self.get_relevant_documents(query)
+
+    def batch_search(self, queries, k=None):
+        """Dense search for many queries at once within this view. Returns one [(Document, L2 distance)] list per query."""
+        return self.vectorstore.batch_search(queries, k or self.search_kwargs["k"], allowed_ids=self.allowed_ids(),
+                                             search_params=self.search_params)
+
+    def nbytes(self):
+        """Resident size of the view itself; the vectors live in the shared store"""
+        allowed = self.allowed_ids()
+        # The id set mirrors the array as Python ints (~60 bytes each)
+        return allowed.nbytes + len(allowed) * 60 if allowed is not None else 0
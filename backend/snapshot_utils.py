@@ -0,0 +1,168 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.utils import assign_chunk_ids, embed_in_batches
+from backend.chunking import assign_token_counts, token_unit
+
+logger = logging.getLogger(__name__)
+
+# Snapshot storage configuration
+SNAPSHOT_CONFIG = {
+    'folder_name': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faiss_snapshots'),
+    'hash_block_size': 1024 * 1024,  # Read files in 1MB blocks while hashing
+    'format_version': 1
+}
+
+def file_content_hash(file_path):
+    """Return the sha256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(SNAPSHOT_CONFIG['hash_block_size']), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def snapshot_key(file_hash, chunker_config, model_id):
+    """Build the snapshot key for a (file content, chunker config, embedding model) triple.
+
+    The effective token unit is part of the chunker settings: chunks cut with estimated counts
+    are never reused once the real tokenizer is available, or vice versa.
+    """
+    payload = json.dumps({
+        'file_hash': file_hash,
+        'chunker': dict(chunker_config, unit=token_unit()),
+        'model': model_id,
+        'format': SNAPSHOT_CONFIG['format_version']
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SnapshotStore:
+    """Per-file store of chunked documents and their embedding vectors.
+
+    Each file is chunked and embedded once per (content hash, chunker config, model id);
+    later boots read the vectors back from disk instead of re-embedding the file.
+    """
+
+    def __init__(self, embeddings, model_id, root=None):
+        self.embeddings = embeddings
+        self.model_id = model_id
+        self.root = root or SNAPSHOT_CONFIG['folder_name']
+        os.makedirs(self.root, exist_ok=True)
+        self._memory = {}  # snapshot key -> (documents, vectors)
+        self._hashes = {}  # (path, mtime, size) -> content hash
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'embedded_files': 0, 'embedded_chunks': 0}
+
+    def _file_hash(self, file_path):
+        stat = os.stat(file_path)
+        cache_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+        if cache_key not in self._hashes:
+            self._hashes[cache_key] = file_content_hash(file_path)
+        return self._hashes[cache_key]
+
+    def _read(self, key):
+        folder = os.path.join(self.root, key)
+        vectors_path = os.path.join(folder, 'vectors.npy')
+        documents_path = os.path.join(folder, 'documents.json')
+        if not (os.path.exists(vectors_path) and os.path.exists(documents_path)):
+            return None
+        try:
+            with open(documents_path, 'r', encoding='utf-8') as f:
+                raw_documents = json.load(f)
+            vectors = np.load(vectors_path)
+            documents = [Document(page_content=d['page_content'], metadata=d['metadata']) for d in raw_documents]
+            if len(documents) != len(vectors):
+                raise ValueError(f"{len(documents)} documents but {len(vectors)} vectors")
+            return documents, vectors
+        except Exception as e:
+            logger.warning(f"Discarding unreadable snapshot {key}: {e}")
+            shutil.rmtree(folder, ignore_errors=True)
+            return None
+
+    def _write(self, key, file_path, chunker_config, documents, vectors):
+        folder = os.path.join(self.root, key)
+        tmp_folder = f"{folder}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            os.makedirs(tmp_folder, exist_ok=True)
+            np.save(os.path.join(tmp_folder, 'vectors.npy'), vectors)
+            with open(os.path.join(tmp_folder, 'documents.json'), 'w', encoding='utf-8') as f:
+                json.dump([{'page_content': d.page_content, 'metadata': d.metadata} for d in documents], f, ensure_ascii=False)
+            with open(os.path.join(tmp_folder, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'source': os.path.basename(file_path),
+                    'chunker': chunker_config,
+                    'model': self.model_id,
+                    'chunks': len(documents),
+                    'created_at': datetime.now().isoformat()
+                }, f, indent=2)
+            # Rename into place so readers never see a half-written snapshot
+            if os.path.exists(folder):
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+            else:
+                os.replace(tmp_folder, folder)
+        except Exception as e:
+            logger.error(f"Error writing snapshot for {file_path}: {e}")
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+
+    def key_for(self, file_path, chunker_config):
+        """Snapshot key of the file's current content (None if the file is missing)"""
+        if not os.path.exists(file_path):
+            return None
+        return snapshot_key(self._file_hash(file_path), chunker_config, self.model_id)
+
+    def has_snapshot(self, file_path, chunker_config):
+        """True if the file's current content is already snapshotted (in memory or on disk)"""
+        if not os.path.exists(file_path):
+            return False
+        key = snapshot_key(self._file_hash(file_path), chunker_config, self.model_id)
+        if key in self._memory:
+            return True
+        folder = os.path.join(self.root, key)
+        return os.path.exists(os.path.join(folder, 'vectors.npy')) and os.path.exists(os.path.join(folder, 'documents.json'))
+
+    def load_file(self, file_path, chunker_config, loader):
+        """Return (documents, vectors) for a file, embedding it only if no snapshot exists.
+
+        `loader` is a zero-argument callable returning the file's chunked Documents.
+        """
+        if not os.path.exists(file_path):
+            logger.error(f"Snapshot source file not found: {file_path}")
+            return [], None
+        key = snapshot_key(self._file_hash(file_path), chunker_config, self.model_id)
+        with self._lock:
+            if key in self._memory:
+                self.stats['memory_hits'] += 1
+                return self._memory[key]
+        loaded = self._read(key)
+        if loaded is not None:
+            self.stats['disk_hits'] += 1
+            logger.info(f"Loaded snapshot for {os.path.basename(file_path)} ({len(loaded[0])} chunks)")
+        else:
+            documents = [doc for doc in loader() if doc.page_content and doc.page_content.strip()]
+            if not documents:
+                return [], None
+            # Batched into a preallocated matrix so large structured files never hold every vector as Python floats
+            vectors = embed_in_batches([doc.page_content for doc in documents], self.embeddings)
+            self._write(key, file_path, chunker_config, documents, vectors)
+            self.stats['embedded_files'] += 1
+            self.stats['embedded_chunks'] += len(documents)
+            logger.info(f"Embedded {os.path.basename(file_path)} ({len(documents)} chunks) and saved snapshot {key[:12]}")
+            loaded = (documents, vectors)
+        # Content-addressed chunk ids let a re-uploaded file replace exactly its own vectors
+        assign_chunk_ids(loaded[0])
+        assign_token_counts(loaded[0])
+        with self._lock:
+            self._memory[key] = loaded
+        return loaded
+
+    def release_memory(self):
+        """Drop the in-process copies once startup indexing is done; snapshots stay on disk."""
+        with self._lock:
+            self._memory.clear()
@@ -0,0 +1,92 @@
+import os
+import re
+import math
+import threading
+from collections import Counter, defaultdict
+
+# Hybrid (BM25 + vector) retrieval configuration
+HYBRID_CONFIG = {
+    'default_enabled': os.getenv('HYBRID_SEARCH', 'true').lower() == 'true',  # Agents without a 'hybridSearch' flag use this
+    'rrf_k': int(os.getenv('HYBRID_RRF_K', 60)),  # Reciprocal-rank fusion constant
+    'candidates': int(os.getenv('HYBRID_CANDIDATES', 50)),  # Results fetched from each leg before fusion
+    'search_threads': int(os.getenv('HYBRID_SEARCH_THREADS', 8)),  # Pool running the dense and sparse legs
+    'bm25_k1': 1.5,
+    'bm25_b': 0.75,
+}
+
+# Keeps identifiers such as "43A", "377" or GSTIN codes as single tokens
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def reciprocal_rank_fusion(rankings, k=None, rrf_k=None):
+    """Fuse several ranked id lists into one: score(id) = sum over lists of 1 / (rrf_k + rank)"""
+    rrf_k = rrf_k or HYBRID_CONFIG['rrf_k']
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (rrf_k + rank)
+    fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    return fused[:k] if k else fused
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring over integer document ids.
+
+    Ids are the same int64 ids the FAISS index uses, so sparse hits map straight back to
+    the shared store's documents and to the per-agent ID selectors.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # token -> {doc id: term frequency}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, doc_ids, texts):
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                counts = Counter(tokenize(text))
+                for token, tf in counts.items():
+                    self.postings[token][doc_id] = tf
+                length = sum(counts.values())
+                self.doc_lengths[doc_id] = length
+                self.total_length += length
+
+    def remove(self, doc_ids, texts):
+        with self._lock:
+            for doc_id, text in zip(doc_ids, texts):
+                for token in set(tokenize(text)):
+                    posting = self.postings.get(token)
+                    if posting is not None:
+                        posting.pop(doc_id, None)
+                        if not posting:
+                            del self.postings[token]
+                self.total_length -= self.doc_lengths.pop(doc_id, 0)
+
+    def search(self, query, k, allowed=None):
+        """Return [(doc id, BM25 score)] for the top k documents, optionally restricted to the `allowed` id set"""
+        k1 = HYBRID_CONFIG['bm25_k1']
+        b = HYBRID_CONFIG['bm25_b']
+        with self._lock:
+            doc_count = len(self.doc_lengths)
+            if not doc_count:
+                return []
+            avg_length = self.total_length / doc_count or 1.0
+            scores = defaultdict(float)
+            for token in set(tokenize(query)):
+                posting = self.postings.get(token)
+                if not posting:
+                    continue
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    if allowed is not None and doc_id not in allowed:
+                        continue
+                    norm = tf + k1 * (1 - b + b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def nbytes(self):
+        """Rough resident size: one (id, tf) entry per posting"""
+        with self._lock:
+            return sum(len(posting) for posting in self.postings.values()) * 16 + len(self.doc_lengths) * 16
@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Startup warm-up configuration
+STARTUP_CONFIG = {
+    'retry_after_seconds': int(os.getenv('STARTUP_RETRY_AFTER_SECONDS', 5)),  # Retry-After sent with 503s while warming up
+}
+
+PENDING = 'pending'
+RUNNING = 'running'
+READY = 'ready'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+class StartupTracker:
+    """Runs named warm-up stages in order on a background thread and records their progress.
+
+    A stage is a (name, callable) pair; the callable receives a `progress(done, total)`
+    function for reporting partial progress. Failed stages are logged and do not stop the
+    stages after them.
+    """
+
+    def __init__(self):
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.started_at = time.time()
+
+    def add(self, name, required=True):
+        with self._lock:
+            self._stages.setdefault(name, {
+                'state': PENDING, 'required': required, 'done': 0, 'total': None,
+                'seconds': None, 'error': None, 'detail': None
+            })
+
+    def _update(self, name, **fields):
+        with self._lock:
+            self._stages[name].update(fields)
+
+    def state(self, name):
+        with self._lock:
+            stage = self._stages.get(name)
+            return stage['state'] if stage else None
+
+    def is_settled(self, name):
+        """True once a stage has finished one way or another (or if it was never scheduled)"""
+        return self.state(name) in (None, READY, FAILED, SKIPPED)
+
+    def skip(self, name, detail=None):
+        self._update(name, state=SKIPPED, detail=detail)
+
+    def run_stage(self, name, func):
+        if self.state(name) == SKIPPED:
+            return
+        started = time.time()
+        self._update(name, state=RUNNING)
+        try:
+            func(lambda done, total=None: self._update(name, done=done, total=total))
+            self._update(name, state=READY, seconds=round(time.time() - started, 3))
+            logger.info(f"[STARTUP] Stage {name} ready in {time.time() - started:.2f}s")
+        except Exception as e:
+            self._update(name, state=FAILED, seconds=round(time.time() - started, 3), error=str(e))
+            logger.error(f"[STARTUP] Stage {name} failed: {e}")
+
+    def start(self, stages):
+        """Run [(name, func), ...] in order on a daemon thread. Only the first call starts anything."""
+        with self._lock:
+            if self._thread is not None:
+                return self._thread
+            self._thread = threading.Thread(target=lambda: [self.run_stage(name, func) for name, func in stages],
+                                            name='startup-warm-up', daemon=True)
+        for name, _ in stages:
+            self.add(name)
+        self._thread.start()
+        return self._thread
+
+    def _all_required_ready(self):
+        return all(stage['state'] in (READY, SKIPPED) for stage in self._stages.values() if stage['required'])
+
+    def ready(self):
+        """True once every required stage is ready (or skipped)"""
+        with self._lock:
+            return self._all_required_ready()
+
+    def report(self):
+        """Per-stage state, progress and timing for /readyz"""
+        with self._lock:
+            return {
+                'ready': self._all_required_ready(),
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'stages': {name: dict(stage) for name, stage in self._stages.items()}
+            }
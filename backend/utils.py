@@ -2,8 +2,22 @@ from typing import List
 from langchain_core.documents import Document
 from langchain_community.vectorstores import FAISS
 from langchain_core.embeddings import Embeddings
+import numpy as np
+import hashlib
+import logging
+import time
 import os
 
+logger = logging.getLogger(__name__)
+
+# Batched embedding configuration
+EMBEDDING_BATCH_CONFIG = {
+    'encode_batch_size': int(os.getenv('EMBED_ENCODE_BATCH_SIZE', 64)),  # Texts per encoder forward pass
+    'embed_batch_size': int(os.getenv('EMBED_BATCH_SIZE', 500)),  # Texts per embed_documents call
+    'faiss_add_batch_size': int(os.getenv('FAISS_ADD_BATCH_SIZE', 4096)),  # Vectors per index.add call
+    'torch_threads': int(os.getenv('EMBED_TORCH_THREADS', 0)),  # torch intra-op threads; 0 leaves the default
+}
+
 def initialize_faiss_index(documents: List[Document], embeddings: Embeddings) -> FAISS:
     """Initialize a FAISS index with the given documents and embeddings."""
     if not documents:
@@ -13,6 +27,67 @@ def initialize_faiss_index(documents: List[Document], embeddings: Embeddings) ->
     vectorstore = FAISS.from_documents(documents, embeddings)
     return vectorstore
 
+def make_chunk_id(source: str, position: int, text: str) -> str:
+    """Stable, content-addressed id for a chunk: the same file content always yields the same ids."""
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return hashlib.sha256(f"{source}\x00{position}\x00{text_hash}".encode('utf-8')).hexdigest()
+
+def assign_chunk_ids(documents: List[Document]) -> List[str]:
+    """Set metadata['chunk_id'] on each document (numbered per source) and return the ids."""
+    positions = {}
+    ids = []
+    for doc in documents:
+        source = doc.metadata.get('source', '')
+        position = positions.get(source, 0)
+        positions[source] = position + 1
+        if not doc.metadata.get('chunk_id'):
+            doc.metadata['chunk_id'] = make_chunk_id(source, position, doc.page_content)
+        # File order, so neighbouring chunks can be merged back together in the prompt
+        doc.metadata.setdefault('chunk_index', position)
+        ids.append(doc.metadata['chunk_id'])
+    return ids
+
+def configure_embedding_threads(threads=None):
+    """Apply the torch intra-op thread budget used by the local sentence-transformer"""
+    threads = threads or EMBEDDING_BATCH_CONFIG['torch_threads']
+    if threads <= 0:
+        return
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        logger.info(f"torch intra-op threads set to {threads}")
+    except ImportError:
+        logger.warning("torch is not installed; ignoring EMBED_TORCH_THREADS")
+
+def embed_in_batches(texts: List[str], embeddings: Embeddings, batch_size: int = None) -> np.ndarray:
+    """Embed texts batch by batch into one preallocated float32 matrix.
+
+    The whole matrix is kept rather than streamed into the index: it is saved as the file's
+    snapshot, and a file's chunks enter the shared store together so searches never see half a file.
+    """
+    batch_size = batch_size or EMBEDDING_BATCH_CONFIG['embed_batch_size']
+    started = time.time()
+    vectors = None
+    for start in range(0, len(texts), batch_size):
+        batch = np.asarray(embeddings.embed_documents(texts[start:start+batch_size]), dtype='float32')
+        if vectors is None:
+            vectors = np.empty((len(texts), batch.shape[1]), dtype='float32')
+        vectors[start:start+len(batch)] = batch
+    elapsed = time.time() - started
+    if texts:
+        logger.info(f"Embedded {len(texts)} chunks in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-6):.1f} docs/sec, batch size {batch_size})")
+    return vectors if vectors is not None else np.empty((0, 0), dtype='float32')
+
+def add_vectors_in_batches(index, vectors, ids=None, batch_size: int = None):
+    """Add vectors to a FAISS index in slices of FAISS_ADD_BATCH_SIZE."""
+    batch_size = batch_size or EMBEDDING_BATCH_CONFIG['faiss_add_batch_size']
+    for start in range(0, len(vectors), batch_size):
+        block = np.ascontiguousarray(vectors[start:start+batch_size], dtype='float32')
+        if ids is None:
+            index.add(block)
+        else:
+            index.add_with_ids(block, np.ascontiguousarray(ids[start:start+batch_size], dtype='int64'))
+
 def update_faiss_index(documents: List[Document], embeddings: Embeddings, existing_index: FAISS = None) -> FAISS:
     """Update an existing FAISS index with new documents or create a new one if none exists."""
     if existing_index:
@@ -1128,7 +1128,7 @@ function getFileType(file) {
           const data = await res.json();
           const assistantContent = data && data.response !== undefined ? String(data.response) : 'Error: Could not retrieve response from backend.';
           const assistantAgentId = data.metadata && data.metadata.agent_id ? data.metadata.agent_id : null;
-          setMessages(msgs => [...msgs, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, modelUsed: data.model_used, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }]);
+          setMessages(msgs => [...msgs, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, modelUsed: data.model_used, documentChunkIds: data.documentChunkIds, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }]);
           if (data.session) {
             setSessions(sessions => sessions.map(session =>
               session.id === data.session.id ? data.session : session
@@ -1302,9 +1302,9 @@ function getFileType(file) {
         setMessages(msgs => {
           // If this is a new session, replace the messages; otherwise, append
           if (!currentSessionId) {
-            return [userMessage, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, agentName: assistantAgentFullName, agentIcon: assistantAgentIcon, lang: detectedLang, modelUsed: data.model_used, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }];
+            return [userMessage, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, agentName: assistantAgentFullName, agentIcon: assistantAgentIcon, lang: detectedLang, modelUsed: data.model_used, documentChunkIds: data.documentChunkIds, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }];
           } else {
-            return [...msgs, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, agentName: assistantAgentFullName, agentIcon: assistantAgentIcon, lang: detectedLang, modelUsed: data.model_used, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }];
+            return [...msgs, { sender: 'assistant', content: assistantContent, agentId: assistantAgentId, agentName: assistantAgentFullName, agentIcon: assistantAgentIcon, lang: detectedLang, modelUsed: data.model_used, documentChunkIds: data.documentChunkIds, modelDisplayName: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).name : null, modelDisplayIcon: data.model_used ? modelOptions.find(m => m.backendName === data.model_used).icon : null }];
           }
         });
         if (data && data.session) {
@@ -2244,7 +2244,7 @@ function getFileType(file) {
       agentId: msg.agentId || 'default_agent',
       agentName: msg.agentName || 'Unknown Agent',
       answerId: msg.id,
-      documentChunkIds: msg.chunkIds,
+      documentChunkIds: msg.documentChunkIds || [],
       rating,
       feedbackText,
       stars,